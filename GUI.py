@@ -11,19 +11,139 @@ It allows you to:
 You must have the main sync logic available in a separate file (e.g., core.py).
 """
 
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import customtkinter as ctk
 from tkinter import messagebox
+
+import metrics
+from autosync import SyncWorker
+from scheduler import Cancelled, RetryBudget
+from widgets import VirtualList
 from core import (
-    get_google_credentials, initialize_database, get_all_local_tasks,
-    add_local_task, push_local_tasks_to_google, get_tasks_online,
-    insert_task_to_db, update_local_task, update_google_tasks_from_local,
-    delete_local_task, get_task_by_id
+    get_google_credentials, initialize_database, count_tasks, query_keyed_tasks,
+    skip_tasks, get_keyed_tasks, add_local_task, push_local_tasks_to_google, pull_from_google,
+    update_local_task, update_google_tasks_from_local,
+    delete_syncable_task, get_task_by_id, search_tasks,
+    subscribe, subscribe_outbox
 )
 
+log = logging.getLogger(__name__)
+
 ctk.set_appearance_mode("System")  # Light, Dark, or System
 ctk.set_default_color_theme("green")  # You can change the theme
 
 
+class TaskPages:
+    """The task list sorted by `order`, as the VirtualList reads it:
+    `count` rows whose pages are fetched on the app's db thread as they
+    scroll into view. A row whose page isn't in yet reads as None and
+    is drawn blank until it arrives.
+
+    Only the keep_pages pages used last are held, so memory stays the
+    same however long the list is. Pages are keyset pages
+    (core.query_tasks): page n is read from the sort key of the row
+    before it, which is remembered for every page seen, and a jump
+    further down skips ahead through the index from the nearest one.
+
+    Edits to the rows held are patched in (patch()) rather than
+    reloading the pages, as long as they don't move a row in the order."""
+    page_size = 100
+    keep_pages = 10
+
+    def __init__(self, app, order, count):
+        self.app = app
+        self.order = order
+        self.count = count
+        self._pages = OrderedDict()  # page -> tasks, least recently used first
+        self._keys = {}  # page -> the sort key of each of its tasks
+        self._starts = {0: None}  # page -> the sort key its first row follows
+        self._loading = set()
+
+    @classmethod
+    def load(cls, app, order, first=0, last=0):
+        """db thread: the list with the pages holding rows first to
+        last already in, so it can replace the old one without a blank
+        frame"""
+        pages = cls(app, order, count_tasks())
+        for page in range(first // cls.page_size, last // cls.page_size + 1):
+            known = max(p for p in pages._starts if p <= page)
+            pages._add(page, pages._fetch(known, pages._starts[known], page))
+        return pages
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        page, row = divmod(index, self.page_size)
+        tasks = self._pages.get(page)
+        if tasks is None:
+            self._load(page)
+            return None
+        self._pages.move_to_end(page)
+        return tasks[row] if row < len(tasks) else None
+
+    def _load(self, page):
+        if page in self._loading:
+            return
+        self._loading.add(page)
+        known = max(p for p in self._starts if p <= page)
+        self.app._in_background(self._fetch, known, self._starts[known], page,
+                                then=lambda result: self._loaded(page, result))
+
+    def _fetch(self, known, after, page):
+        """db thread: (starts, (task, key) pairs) for `page`, from page
+        `known` which starts after `after`"""
+        starts = {}
+        if page > known:
+            after = skip_tasks(self.order, after, (page - known) * self.page_size)
+            if after is None:  # the list got shorter
+                return starts, []
+            starts[page] = after
+        rows = query_keyed_tasks(self.order, after, self.page_size)
+        if len(rows) == self.page_size:
+            starts[page + 1] = rows[-1][1]
+        return starts, rows
+
+    def _add(self, page, result):
+        starts, rows = result
+        self._starts.update(starts)
+        self._pages[page] = [task for task, _ in rows]
+        self._keys[page] = [key for _, key in rows]
+        while len(self._pages) > self.keep_pages:
+            del self._keys[self._pages.popitem(last=False)[0]]
+
+    def patch(self, rows):
+        """Put the re-read `rows` ({id: (task, key)}, get_keyed_tasks)
+        in place of the tasks they replace. returns False, leaving the
+        pages as they were, if one of them moved in the order or isn't
+        on a page held: a row moving anywhere shifts the rows after it,
+        and only a reload can show that."""
+        places = {}
+        for page, tasks in self._pages.items():
+            for i, task in enumerate(tasks):
+                if task.id in rows:
+                    if rows[task.id][1] != self._keys[page][i]:
+                        return False
+                    places[task.id] = (page, i)
+        if len(places) < len(rows):
+            return False
+        for task_id, (page, i) in places.items():
+            self._pages[page][i] = rows[task_id][0]
+        return True
+
+    def _loaded(self, page, result):
+        self._loading.discard(page)
+        self._add(page, result)
+        if self.app.tasks is self and not self.app.query:
+            self.app.task_list.redraw()
+
+
 class app:
     """offline default app"""
     dark_grey = "#333333"
@@ -31,30 +151,78 @@ class app:
     blue = "#4d65ff"
     red = "#e41b1b"
     green = "green"
+    frame_ms = 16  # db changes are gathered up and drawn once per frame
+    dispatch_ms = 8  # most of a frame handing results to the widgets may take
+    search_ms = 100  # wait this long after a keystroke before searching
+    search_limit = 500
+    # what order_tasks() can sort by, as the sort menu names them
+    orders = {"Google order": "position", "Due date": "due_time",
+              "Status": "status", "List": "list"}
 
     def __init__(self, master: ctk.CTk):
         self.master = master
         self.master.title("📝 BobsiMo")
         self.master.geometry("700x500")
 
+        self.tasks = []
+        self.order = "position"
+        self.query = ""
+        self._search_job = None
+        # ids written since the last frame, added to by the writer's
+        # thread and taken by _apply_changes
+        self._changes_lock = threading.Lock()
+        self._changed = set()  # inserted or updated
+        self._reshaped = False  # rows were added or removed
+
+        # Tk widgets may only be touched from this thread, and it must
+        # never wait on SQLite or the network. core.py work goes to the
+        # one db thread (so writes land in the order they were made) or
+        # the network thread; what comes back is queued on _inbox and
+        # handed over once a frame
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gui-db')
+        self._net = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gui-net')
+        self._inbox = queue.SimpleQueue()
+        self._reload_job = None
+        self._long_job = None
+        self._progress = None
+
+        # credentials may need the network (a token refresh) or even a
+        # browser sign-in, so they load in the background once the
+        # window is up; until then the app works offline
+        self.creds = None
+        self.creds_ready = threading.Event()
+        self.master.after_idle(self._load_creds)
+
+    def _load_creds(self):
+        # draw the window before the worker starts importing the google
+        # libraries, which holds the GIL for a few hundred ms
+        self.master.update_idletasks()
+        threading.Thread(target=self._load_creds_worker, daemon=True).start()
+
+    def _load_creds_worker(self):
         try:
             self.creds = get_google_credentials()
         except Exception as e:
-            self.creds = None
+            log.warning("⚠️ Not signed in to Google, working offline: %s", e)
+        finally:
+            self.creds_ready.set()
 
     def framing(self):
-        # Create scrollable frame for tasks
-        self.scrollable_frame = ctk.CTkScrollableFrame(
-            self.master, width=480, height=400)
-        self.scrollable_frame.pack(pady=10, padx=10, fill="both", expand=True)
+        # Create scrollable list for tasks
+        self.task_list = VirtualList(
+            self.master, self._make_task_bt, self._bind_task_bt,
+            width=480, height=400)
+        self.task_list.pack(pady=10, padx=10, fill="both", expand=True)
 
         btn_frame = ctk.CTkFrame(self.master)
         btn_frame.pack(pady=5)
 
         ctk.CTkButton(btn_frame, text="🔄 Sync from Google",
-                      command=self.sync_from_google).grid(row=0, column=0, padx=5)
+                      command=lambda: self._run_long("Pulling from Google", self.sync_from_google)
+                      ).grid(row=0, column=0, padx=5)
         ctk.CTkButton(btn_frame, text="☁️ Push to Google",
-                      command=self.push_to_google).grid(row=0, column=1, padx=5)
+                      command=lambda: self._run_long("Pushing to Google", self.push_to_google)
+                      ).grid(row=0, column=1, padx=5)
         ctk.CTkButton(btn_frame, text="➕ Add Local Task",
                       command=self.add_task).grid(row=0, column=2, padx=5)
         ctk.CTkButton(btn_frame, text="🔁 Refresh", command=self.refresh).grid(
@@ -62,28 +230,194 @@ class app:
 
         initialize_database()
         self.refresh()
+        self._watch_db()
 
-    def refresh(self):
-        """Refresh the UI with all tasks in the DB"""
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
+    def _in_background(self, fn, *args, then=None, **kwargs):
+        """run fn(*args, **kwargs) on the db thread, then then(result)
+        back on this one; returns the future"""
+        future = self._db.submit(fn, *args, **kwargs)
+        future.add_done_callback(lambda f: self._post(self._done, f, then))
+        return future
 
-        tasks = get_all_local_tasks()
-        for task in tasks:
-            task_id, title, list_name, due, notes, status = task
-            self._make_task_bt(task_id, title, list_name, due, notes, status)
+    def _post(self, fn, *args):
+        """have fn(*args) called on the Tk thread; safe from any thread"""
+        self._inbox.put((fn, args))
 
-    def _make_task_bt(self, task_id, title, list_name, due, notes, status):
-        cb_frame = ctk.CTkFrame(self.scrollable_frame)
+    def _done(self, future, then):
+        try:
+            result = future.result()
+        except Exception as e:
+            log.error("❌ %s", e, exc_info=e)
+            messagebox.showerror("Something went wrong", str(e))
+            return
+        if then is not None:
+            then(result)
+
+    def _dispatch(self):
+        """run what other threads posted, for at most dispatch_ms; the
+        rest waits for the next frame"""
+        deadline = time.perf_counter() + self.dispatch_ms / 1000
+        while time.perf_counter() < deadline:
+            try:
+                fn, args = self._inbox.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception:
+                log.exception("Error updating the window")
 
-        cb_frame.pack(anchor='w', pady=4, padx=8, expand=1, fill="x")
-        var = ctk.BooleanVar(value=(status == 'completed'))
-        cb = ctk.CTkCheckBox(
+    def refresh(self):
+        """Refresh the UI with all tasks in the DB"""
+        first, last = self.task_list.visible()
+        return self._in_background(TaskPages.load, self, self.order, first, last,
+                                   then=self._set_tasks)
+
+    def _set_tasks(self, tasks):
+        with metrics.timer('ui refresh'):
+            self.tasks = tasks
+            self._show()
+
+    def _show(self):
+        """put either every task or the current search results in the list"""
+        if self.query:
+            query = self.query
+            self._in_background(search_tasks, query, self.search_limit,
+                                then=lambda rows: self._show_results(query, rows))
+        else:
+            self.task_list.set_items(self.tasks)
+
+    def _show_results(self, query, rows):
+        if query == self.query:  # not overtaken by more typing
+            self.task_list.set_items(rows)
+
+    def _on_search_key(self, event=None):
+        # search once typing pauses rather than on every keystroke
+        if self._search_job is not None:
+            self.master.after_cancel(self._search_job)
+        self._search_job = self.master.after(self.search_ms, self._search)
+
+    def _search(self):
+        self._search_job = None
+        query = self.search_entry.get().strip()
+        if query != self.query:
+            self.query = query
+            self._show()
+
+    def _watch_db(self):
+        """keep the list in step with core's writes from now on"""
+        subscribe(self._on_db_change)
+        self.master.after(self.frame_ms, self._tick)
+
+    def _tick(self):
+        self._dispatch()
+        self._apply_changes()
+        self.master.after(self.frame_ms, self._tick)
+
+    def _on_db_change(self, inserted, updated, deleted):
+        # called on whichever thread wrote
+        with self._changes_lock:
+            self._changed |= updated
+            self._reshaped = self._reshaped or bool(inserted or deleted)
+
+    def _apply_changes(self):
+        """bring the list up to date with the writes since the last
+        frame, redrawing once however many there were. Edits to rows held
+        only re-read those rows and patch them in; a write that adds or
+        removes rows, moves one in the order or touches one not held
+        reloads the rows in view. One
+        of these runs at a time, so during a big sync changes pile up
+        between them instead of queueing one per frame."""
+        if self._reload_job is not None and not self._reload_job.done():
+            return
+        with self._changes_lock:
+            changed, reshaped = self._changed, self._reshaped
+            self._changed, self._reshaped = set(), False
+        if reshaped:
+            self._reload_job = self.refresh()
+        elif changed:
+            pages = self.tasks
+            self._reload_job = self._in_background(
+                get_keyed_tasks, changed, self.order,
+                then=lambda rows: self._patch(pages, changed, rows))
+
+    def _patch(self, pages, changed, rows):
+        if pages is not self.tasks:
+            # reloaded or re-sorted meanwhile, maybe from before the
+            # writes; go again on the new pages next frame
+            with self._changes_lock:
+                self._changed |= changed
+            return
+        if not isinstance(pages, TaskPages) or not pages.patch(rows):
+            self._reload_job = self.refresh()
+            return
+        self._show()
+
+    def _run_long(self, label, fn):
+        """run fn(budget) on the network thread with the progress bar up;
+        its Cancel button cancels the budget"""
+        if self.creds is None:
+            messagebox.showerror("Get your credentials from google cloud",
+                                 "You have to connect with your google account first")
+            return
+        if self._long_job is not None and not self._long_job.done():
+            return  # one at a time
+        budget = RetryBudget()
+        self._start_progress(label, budget)
+        self._long_job = self._net.submit(fn, budget)
+        self._long_job.add_done_callback(lambda f: self._post(self._finish_long, f))
+
+    def _finish_long(self, future):
+        self._stop_progress()
+        try:
+            future.result()
+        except Cancelled:
+            log.info("⏹️ Cancelled")
+        except Exception as e:
+            log.error("❌ %s", e, exc_info=e)
+            messagebox.showerror("Something went wrong", str(e))
+
+    def _start_progress(self, label, budget):
+        """show the progress bar; Cancel cancels `budget`"""
+        if self._progress is None:
+            frame = self._progress = ctk.CTkFrame(self.master)
+            frame.label = ctk.CTkLabel(frame, text="")
+            frame.label.pack(side="left", padx=10)
+            frame.bar = ctk.CTkProgressBar(frame, mode="indeterminate")
+            frame.bar.pack(side="left", fill="x", expand=True, padx=10)
+            frame.cancel = ctk.CTkButton(frame, text="Cancel", width=60,
+                                         fg_color=self.dark_grey, hover_color=self.red)
+            frame.cancel.pack(side="right", padx=10)
+        frame = self._progress
+        frame.label.configure(text=label)
+        frame.cancel.configure(state="normal", command=lambda: self._cancel(budget))
+        frame.pack(side="bottom", fill="x", padx=10, pady=5)
+        frame.bar.start()
+
+    def _cancel(self, budget):
+        # the running call finishes, nothing after it is sent
+        budget.cancel()
+        self._progress.label.configure(text="Cancelling…")
+        self._progress.cancel.configure(state="disabled")
+
+    def _stop_progress(self):
+        if self._progress is not None:
+            self._progress.bar.stop()
+            self._progress.pack_forget()
+
+    def _make_task_bt(self, parent):
+        """build one task row; the list reuses it for whichever
+        task scrolls into its slot (see _bind_task_bt)"""
+        cb_frame = ctk.CTkFrame(parent)
+        cb_frame.task_id = None
+        cb_frame.var = ctk.BooleanVar()
+
+        cb_frame.checkbox = ctk.CTkCheckBox(
             cb_frame,
-            text=title,
-            variable=var,
-            command=lambda tid=task_id, v=var: self.toggle_task_complete(
-                tid, v),
+            text="",
+            variable=cb_frame.var,
+            command=lambda f=cb_frame: self.toggle_task_complete(
+                f.task_id, f.var),
             font=("Segoe UI", 14),
             checkbox_height=25,
             checkbox_width=25,
@@ -91,13 +425,13 @@ class app:
             width=440,
             corner_radius=6
         )
-        cb.pack(side="left")
+        cb_frame.checkbox.pack(side="left")
 
         del_task_bt = ctk.CTkButton(
             cb_frame, width=20,
             text="Delete", fg_color=self.dark_grey, hover_color=self.red,
             command=lambda
-            tid=task_id: self.delete_task(task_id=tid))
+            f=cb_frame: self.delete_task(task_id=f.task_id))
 
         del_task_bt.pack(side="right", padx=10)
 
@@ -106,14 +440,26 @@ class app:
             text="Edit",
             fg_color=self.dark_grey, hover_color=self.blue,
             command=lambda
-            tid=task_id: self.edit_task_win(task_id=tid))
+            f=cb_frame: self.edit_task_win(task_id=f.task_id))
 
         edit_task_bt.pack(side="right",)
+        return cb_frame
+
+    def _bind_task_bt(self, cb_frame, task):
+        if task is None:  # its page is still loading
+            cb_frame.task_id, title, status = None, "", None
+        else:
+            cb_frame.task_id, title, status = task.id, task.title, task.status
+        if cb_frame.checkbox.cget("text") != title:
+            cb_frame.checkbox.configure(text=title)
+        cb_frame.var.set(status == 'completed')
 
     def toggle_task_complete(self, task_id, var):
+        if task_id is None:
+            return
         new_status = 'completed' if var.get() else 'needsAction'
-        update_local_task(task_id, status=new_status)
-        print(f"Task {task_id} status updated to {new_status}")
+        self._in_background(update_local_task, task_id, status=new_status)
+        log.debug("Task %s status updated to %s", task_id, new_status)
 
     def task_maker_win(self, edit=False, task_id=None, title=None,
                        list_name=None,
@@ -185,14 +531,12 @@ class app:
                           command=self.act_win.destroy).pack(
                               side="left", padx=5)
         else:
+            # the entries are read when Edit is clicked, not now
             ctk.CTkButton(self.actions_area, text="Edit",
-                          command=lambda
-                          title=self.title_entry.get(),
-                          list_name=self.list_entry.get(),
-                          due_time=self.due_entry.get(),
-                          notes=self.notes_entry.get(), :
+                          command=lambda:
                           self.edit_task(
-                              task_id, title, list_name, due_time, notes)
+                              task_id, self.title_entry.get(), self.list_entry.get(),
+                              self.due_entry.get(), self.notes_entry.get())
                           ).pack(
                 side="left", padx=5)
             ctk.CTkButton(self.actions_area, text="Cancel",
@@ -209,7 +553,14 @@ class app:
                 self.notes_entry.insert(0, str(notes))
 
     def edit_task_win(self, task_id):
-        task = list(get_task_by_id(task_id))
+        # the list only has what it shows; this reads the notes too
+        if task_id is not None:
+            self._in_background(get_task_by_id, task_id, then=self._open_edit_win)
+
+    def _open_edit_win(self, task):
+        if task is None:  # deleted meanwhile, e.g. by a sync
+            return
+        task = list(task)
         tid = task[0]
         title = task[1]
         list_name = task[2]
@@ -229,42 +580,47 @@ class app:
         list_name = self.list_entry.get()
         due_time = self.due_entry.get()
         notes = self.notes_entry.get()
-        add_local_task(title, list_name, due_time, notes)
-        self.refresh()
+        self._in_background(add_local_task, title, list_name, due_time, notes)
         self.act_win.destroy()
 
-    def order_tasks(self):
-        pass
+    def order_tasks(self, order="position"):
+        """sort the list by `order`: position (Google's), due_time,
+        status or list"""
+        self.order = order
+        self.task_list.scroll_to(0)
+        self.refresh()
 
     def delete_task(self, task_id):
         """Delete the task"""
-        delete_local_task(task_id)
-        self.refresh()  # refresh
+        if task_id is not None:
+            self._in_background(delete_syncable_task, task_id)
 
     def edit_task(self, task_id, title, list_name, due_time, notes):
-        """edit task just like add but modification"""
-        self.add_task(title, list_name, due_time, notes)
-        self.delete_task(task_id)
-
-    def push_to_google(self):
-        if self.creds is not None:
-            push_local_tasks_to_google(self.creds)
-        else:
-            messagebox.showerror("Get your credentials from google cloud",
-                                 "You have to connect with your google account first")
-
-        self.refresh()
+        """save the edit window onto the task, in place: it keeps its id,
+        and only the fields that changed get pushed"""
+        if task_id is not None:
+            # a task has to be in some list, a blank one leaves it where it is
+            self._in_background(update_local_task, task_id, title=title,
+                                list_name=list_name or None, due_time=due_time, notes=notes)
+        self.act_win.destroy()
 
-    def sync_from_google(self):
-        tasks = get_tasks_online(self.creds)
-        for task in tasks:
-            insert_task_to_db(task)
-        self.refresh()
+    def push_to_google(self, budget=None):
+        """push; returns False when not signed in. Runs off the Tk thread."""
+        if self.creds is None:
+            return False
+        push_local_tasks_to_google(self.creds, budget)
         return True
 
+    def sync_from_google(self, budget=None):
+        """pull; returns pull_from_google's counts, or None when not signed
+        in. Runs off the Tk thread."""
+        if self.creds is None:
+            return None
+        return pull_from_google(self.creds, budget=budget)
+
     def update_completed_tasks(self):
-        update_google_tasks_from_local(self.creds)
-        self.refresh()
+        self._run_long("Pushing to Google",
+                       lambda budget: update_google_tasks_from_local(self.creds))
 
 
 class taskApp(app):
@@ -273,6 +629,8 @@ class taskApp(app):
     def __init__(self, master) -> None:
         initialize_database()
         self.master = master
+        # every sync runs on this one thread; it starts once signed in
+        self.syncer = SyncWorker(self.sync)
         super().__init__(self.master)
 
         self.master.title("BobsiMo Activities")
@@ -289,10 +647,20 @@ class taskApp(app):
                       text="Sync with Google", width=60, fg_color=self.dark_grey,
                       command=self._sync_engine).pack(side="right", padx=10)
 
-        # Create scrollable frame for tasks
-        self.scrollable_frame = ctk.CTkScrollableFrame(
-            master, width=480, height=200)
-        self.scrollable_frame.pack(pady=10, padx=10, fill="both", expand=True)
+        ctk.CTkOptionMenu(header_frame, values=list(self.orders), width=120,
+                          command=lambda label: self.order_tasks(self.orders[label])
+                          ).pack(side="right", padx=10)
+
+        self.search_entry = ctk.CTkEntry(
+            header_frame, placeholder_text="🔍 Search tasks")
+        self.search_entry.pack(side="left", fill="x", expand=True)
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
+
+        # Create scrollable list for tasks
+        self.task_list = VirtualList(
+            master, self._make_task_bt, self._bind_task_bt,
+            width=480, height=200)
+        self.task_list.pack(pady=10, padx=10, fill="both", expand=True)
 
         btn_frame = ctk.CTkFrame(master)
         btn_frame.pack(pady=5, padx=10, fill="x")
@@ -301,8 +669,15 @@ class taskApp(app):
                       command=self.task_maker_win).pack(side="right")
 
         self.refresh()
+        self._watch_db()
+        subscribe_outbox(self.syncer.request_push)
+
+    def _load_creds_worker(self):
+        super()._load_creds_worker()
+        if self.creds is not None:
+            self.syncer.start()
 
-    def sync(self):
+    def sync(self, pull=True, shown=False):
         """Establish the 2way street between this and google. If there
         are any here that aren't on google, then push them
 
@@ -325,21 +700,52 @@ class taskApp(app):
         So maybe instead of really removing them from this local db
         maybe we can mark it as deleted so that we can make an API call
         to delete that exact task. All this while syncing, we are trying to mirror
+
+        Runs on self.syncer's thread: pushes, pulling first if `pull`, with
+        the progress bar up if `shown` (the user clicked Sync; background
+        syncs stay out of the way). returns (whether the pull changed anything here, whether it got
+        any answer from Google), see autosync.SyncWorker.
         """
-        if self.sync_from_google():
-            self.push_to_google()
+        metrics.reset()
+        budget = RetryBudget()  # shared by the pull and the push
+        counts = None
+        if shown:
+            self._post(self._start_progress, "Syncing with Google", budget)
+        try:
+            with metrics.timer('sync'):
+                if pull:
+                    counts = self.sync_from_google(budget)
+                self.push_to_google(budget)
+        except Cancelled:
+            log.info("⏹️ Sync cancelled")
+        finally:
+            if shown:
+                self._post(self._stop_progress)
+        # written to $BMA_METRICS if set
+        report = metrics.dump()
+        log.info("🔁 Sync took %.2fs: %s", report['timers']['sync']['seconds'],
+                 report['counters'])
+        if counts is None:
+            return None, False
+        changed = any(counts[key] for key in ('inserted', 'updated', 'deleted'))
+        return changed, counts['requests'] > 0
 
     def _sync_engine(self):
-        import threading
-        t = threading.Thread(target=self.sync)
-        t.daemon = True
-        t.start()
+        """sync now; clicks while a sync runs add up to one more"""
+        if self.creds_ready.is_set() and self.creds is None:
+            messagebox.showerror("Get your credentials from google cloud",
+                                 "You have to connect with your google account first")
+            return
+        # a click during startup is picked up once signed in
+        self.syncer.request_sync()
 
 
 def main():
+    metrics.setup_logging()
     root = ctk.CTk()
-    taskApp(root)
+    window = taskApp(root)
     root.mainloop()
+    window.syncer.stop()
 
 
 if __name__ == '__main__':
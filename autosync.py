@@ -0,0 +1,168 @@
+"""The background sync worker behind the GUI.
+
+One long-lived thread does every sync, so two can never overlap. It
+wakes up for three reasons:
+
+- local edits: request_push() is called after each one. The push is
+  debounced, so a burst of edits becomes one push PUSH_DELAY seconds
+  after the last of them (but never more than PUSH_MAX_DELAY after the
+  first).
+- a periodic pull, every PULL_MIN seconds at first. Each pull that
+  brings nothing new doubles the wait, up to PULL_MAX; one that does
+  brings it back down.
+- request_sync(), for the "Sync" button: pull and push now.
+
+Requests only set flags, so however many come in while a sync is
+running they add up to a single follow-up run. Before each automatic
+run the worker checks that Google is reachable; while it isn't the
+worker stays paused, checking again every OFFLINE_MIN seconds doubling
+up to OFFLINE_MAX, and local edits just wait in the outbox.
+
+request_sync() skips that check and just tries, since the check is only
+a TCP connect and can't see Google from behind an HTTP proxy. If such a
+run gets answers from Google while the check still says offline, the
+check is wrong on this network and the worker stops using it.
+"""
+import logging
+import socket
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+PUSH_DELAY = 3.0  # seconds of quiet after an edit before pushing
+PUSH_MAX_DELAY = 30.0
+PULL_MIN = 60.0
+PULL_MAX = 15 * 60.0
+OFFLINE_MIN = 10.0
+OFFLINE_MAX = 5 * 60.0
+PROBE_ADDRESS = ('tasks.googleapis.com', 443)
+PROBE_TIMEOUT = 3.0
+
+
+def is_online():
+    """whether a connection to Google's API host can be opened"""
+    try:
+        socket.create_connection(PROBE_ADDRESS, timeout=PROBE_TIMEOUT).close()
+        return True
+    except OSError:
+        return False
+
+
+class SyncWorker:
+    """Runs run(pull, forced) on its own thread whenever a sync is due.
+    run pushes the outbox, pulling first when `pull` is set; `forced`
+    says the user asked for it (request_sync). It returns
+    (changed, reached): whether the pull changed anything (None if it
+    doesn't know) and whether any request got an answer from Google."""
+
+    def __init__(self, run, probe=is_online):
+        self._run = run
+        self._probe = probe
+        self._cond = threading.Condition()
+        self._pull = False  # a pull was asked for
+        self._forced = False  # ...by request_sync, so don't probe first
+        self._push_at = None  # when the debounced push is due
+        self._push_deadline = None
+        self._next_pull = time.monotonic()  # the first pull is right away
+        self._resume_at = 0.0  # paused until then while offline
+        self._stopped = False
+        self.pull_interval = PULL_MIN
+        self.offline_delay = OFFLINE_MIN
+        self.online = True
+        self._thread = threading.Thread(target=self._loop, name='sync', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """let the thread end after the sync it's in, if any"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def request_push(self):
+        """push soon; called after every local edit"""
+        with self._cond:
+            now = time.monotonic()
+            if self._push_deadline is None:
+                self._push_deadline = now + PUSH_MAX_DELAY
+            self._push_at = min(now + PUSH_DELAY, self._push_deadline)
+            self._cond.notify()
+
+    def request_sync(self):
+        """pull and push now, even if offline a moment ago"""
+        with self._cond:
+            self._pull = self._forced = True
+            self._push_at = time.monotonic()
+            self._resume_at = 0.0
+            self._cond.notify()
+
+    def _wait(self):
+        """block until a run is due and return (pull, forced), or None
+        once stopped. Called with the condition held."""
+        while not self._stopped:
+            now = time.monotonic()
+            if now >= self._resume_at:
+                pull = self._pull or now >= self._next_pull
+                if pull or (self._push_at is not None and now >= self._push_at):
+                    # every run pushes, so this covers a pending push too
+                    forced, self._pull, self._forced = self._forced, False, False
+                    self._push_at = self._push_deadline = None
+                    return pull, forced
+            wake = now if self._pull else self._next_pull
+            if self._push_at is not None:
+                wake = min(wake, self._push_at)
+            self._cond.wait(max(wake, self._resume_at) - now)
+        return None
+
+    def _back_online(self):
+        self.online = True
+        self.offline_delay = OFFLINE_MIN
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                due = self._wait()
+            if due is None:
+                return
+            pull, forced = due
+
+            if not forced and self._probe and not self._probe():
+                with self._cond:
+                    # keep what was asked for until we're back
+                    self._pull = self._pull or pull
+                    if self._push_at is None:
+                        self._push_at = time.monotonic()
+                    self._resume_at = time.monotonic() + self.offline_delay
+                    if self.online:
+                        log.info("📴 Offline, syncing paused")
+                    self.online = False
+                    self.offline_delay = min(OFFLINE_MAX, self.offline_delay * 2)
+                continue
+            if not forced:
+                if not self.online:
+                    log.info("📶 Back online, syncing")
+                self._back_online()
+
+            try:
+                changed, reached = self._run(pull, forced)
+            except Exception:
+                log.exception("Background sync failed")
+                changed, reached = None, False
+            if forced and not self.online and reached:
+                # Google answered; if the probe still can't reach it, it
+                # never will from here
+                if self._probe and not self._probe():
+                    log.info("🔌 Google is reachable but the probe says not, ignoring it from now on")
+                    self._probe = None
+                self._back_online()
+
+            if pull:
+                with self._cond:
+                    if changed:
+                        self.pull_interval = PULL_MIN
+                    elif changed is False:
+                        self.pull_interval = min(PULL_MAX, self.pull_interval * 2)
+                    self._next_pull = time.monotonic() + self.pull_interval
+                log.debug("Next pull in %.0fs", self.pull_interval)
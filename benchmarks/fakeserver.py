@@ -0,0 +1,366 @@
+"""An in-process fake of the Google Tasks v1 API, for load tests.
+
+FakeTasksServer keeps task lists and tasks in memory and answers the
+requests googleapiclient makes: tasklists and tasks list/get/insert/
+update/patch/delete, tasks.move to another list, pagination, ETags with If-None-Match (304),
+updatedMin/showCompleted/showDeleted/showHidden, and the /batch
+endpoint. Nothing leaves the process: server.http() returns an
+httplib2.Http lookalike to hand to google_service.set_http_factory().
+
+    server = FakeTasksServer(latency=0.05, error_rate=0.01)
+    server.load(make_tasklists(20), make_tasks(5000, ...))
+    google_service.set_http_factory(server.http)
+
+Latency is added per HTTP round trip (a batch of 50 pays it once).
+Errors can be injected at random (error_rate), queued for the next
+calls (fail_next), or come from going over a queries-per-minute quota
+(qpm, a rolling window like Google's); 429s carry a Retry-After header
+like Google's do.
+"""
+import email
+import email.policy
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+
+REASONS = {200: 'OK', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request',
+           404: 'Not Found', 429: 'Too Many Requests', 500: 'Internal Server Error',
+           503: 'Service Unavailable'}
+ERROR_REASONS = {429: 'rateLimitExceeded', 404: 'notFound', 400: 'invalid',
+                 500: 'backendError', 503: 'backendError'}
+
+
+class FakeTasksServer:
+    """the Tasks API's state and request handling, see the module docstring"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=429,
+                 retry_after=1, qpm=None, max_page_size=100, seed=0):
+        self.latency = latency  # seconds added to every HTTP round trip
+        self.jitter = jitter  # plus up to this much at random
+        self.error_rate = error_rate  # share of API calls answered with error_status
+        self.error_status = error_status
+        self.retry_after = retry_after  # seconds, sent with 429s
+        self.qpm = qpm  # API calls allowed per minute, None for no quota
+        self.max_page_size = max_page_size
+
+        self.lock = threading.RLock()
+        self.lists = {}  # id -> tasklist resource, in creation order
+        self.tasks = {}  # list id -> {task id: task resource}
+        self.stats = Counter()
+        self._failures = deque()
+        self._calls = deque()  # times of recent calls, for the quota
+        self._rng = random.Random(seed)
+        self._last_time = datetime.now(timezone.utc)
+        self._top_position = 10 ** 19
+
+    # --- setting up an account ---------------------------------------
+
+    def add_tasklist(self, title, list_id=None, updated=None):
+        with self.lock:
+            tasklist = {'kind': 'tasks#taskList', 'id': list_id or self._new_id(),
+                        'title': title, 'updated': updated or self._now()}
+            tasklist['etag'] = _etag(tasklist)
+            self.lists[tasklist['id']] = tasklist
+            self.tasks[tasklist['id']] = {}
+            return tasklist
+
+    def add_task(self, list_id, title, notes=None, due=None, status='needsAction',
+                 task_id=None, updated=None, position=None):
+        with self.lock:
+            if position is None:  # new tasks go to the top, as in Google Tasks
+                self._top_position -= 1
+                position = f'{self._top_position:020d}'
+            task = {'kind': 'tasks#task', 'id': task_id or self._new_id(),
+                    'title': title, 'status': status, 'position': position,
+                    'updated': updated or self._now()}
+            if notes:
+                task['notes'] = notes
+            if due:
+                task['due'] = due
+            task['etag'] = _etag(task)
+            self.tasks[list_id][task['id']] = task
+            return task
+
+    def load(self, tasklists, tasks):
+        """seed the account with benchmarks/synthetic.py style lists and tasks"""
+        for tasklist in tasklists:
+            self.add_tasklist(tasklist['title'], tasklist['id'], tasklist.get('updated'))
+        for task in tasks:
+            due = task.get('due')
+            self.add_task(task['list_id'], task['title'], task.get('notes'),
+                          None if due == 'No due date' else due, task['status'],
+                          task['id'], task.get('updated'), task.get('position'))
+
+    def edit_tasks(self, count):
+        """change `count` random tasks, as if edited on another device"""
+        with self.lock:
+            live = [t for tasks in self.tasks.values() for t in tasks.values()
+                    if not t.get('deleted')]
+            for task in self._rng.sample(live, min(count, len(live))):
+                task['title'] = f"{task['title']} (edited)"
+                self._touch(task)
+
+    def fail_next(self, *statuses):
+        """answer the next API calls with these error statuses, in order"""
+        with self.lock:
+            self._failures.extend(statuses)
+
+    def live_tasks(self):
+        """{task id: task} of every task not deleted"""
+        with self.lock:
+            return {t['id']: t for tasks in self.tasks.values() for t in tasks.values()
+                    if not t.get('deleted')}
+
+    def http(self):
+        return FakeHttp(self)
+
+    # --- HTTP ----------------------------------------------------------
+
+    def request(self, method, uri, headers, body):
+        """one HTTP round trip; returns (status, headers, body bytes)"""
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        with self.lock:
+            self.stats['http_requests'] += 1
+        path = urlsplit(uri).path
+        if path.rstrip('/').endswith('/batch') or path == '/batch':
+            status, out_headers, content = self._batch(headers, body)
+        else:
+            status, out_headers, content = self.call(method, uri, headers, body)
+        with self.lock:
+            self.stats['bytes_in'] += len(body or b'')
+            self.stats['bytes_out'] += len(content)
+        return status, out_headers, content
+
+    def call(self, method, uri, headers, body):
+        """one API call, on its own or as part of a batch"""
+        with self.lock:
+            self.stats['api_calls'] += 1
+            error = self._injected_error()
+            if error is not None:
+                self.stats[f'errors_{error}'] += 1
+                return self._error(error)
+
+            parts = urlsplit(uri)
+            query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+            path = parts.path.split('/tasks/v1/', 1)[-1].strip('/')
+            segments = [unquote(s) for s in path.split('/')]
+            data = json.loads(body) if body else {}
+            self.stats[f'{method} {_route(segments)}'] += 1
+
+            try:
+                status, payload = self._dispatch(method, segments, query, data)
+            except (KeyError, IndexError):
+                return self._error(404)
+            if status == 204:
+                return 204, {}, b''
+            content = json.dumps(payload).encode()
+            out_headers = {'content-type': 'application/json; charset=UTF-8'}
+            if method == 'GET':
+                etag = payload['etag']
+                if headers.get('if-none-match') == etag:
+                    return 304, {'etag': etag}, b''
+                out_headers['etag'] = etag
+            return status, out_headers, content
+
+    # --- the API -------------------------------------------------------
+
+    def _dispatch(self, method, segments, query, data):
+        if segments[:3] == ['users', '@me', 'lists']:
+            if len(segments) == 3:
+                if method == 'GET':
+                    return 200, self._page('tasks#taskLists', list(self.lists.values()), query, 20)
+                if method == 'POST':
+                    return 200, self.add_tasklist(data.get('title', ''))
+            list_id = self._list_id(segments[3])
+            tasklist = self.lists[list_id]
+            if method == 'GET':
+                return 200, tasklist
+            if method in ('PUT', 'PATCH'):
+                tasklist['title'] = data.get('title', tasklist['title'])
+                self._touch(tasklist)
+                return 200, tasklist
+            if method == 'DELETE':
+                del self.lists[list_id], self.tasks[list_id]
+                return 204, None
+
+        if segments[0] == 'lists' and len(segments) >= 3 and segments[2] == 'tasks':
+            list_id = self._list_id(segments[1])
+            tasks = self.tasks[list_id]
+            if len(segments) == 3:
+                if method == 'GET':
+                    return 200, self._page('tasks#tasks', self._visible(tasks, query), query, 20)
+                if method == 'POST':
+                    task = self.add_task(list_id, data.get('title', ''), data.get('notes'),
+                                         data.get('due'), data.get('status', 'needsAction'))
+                    return 200, task
+            task = tasks[segments[3]]
+            if segments[4:] == ['move'] and method == 'POST':
+                destination = self._list_id(query.get('destinationTasklist', list_id))
+                if destination != list_id:
+                    del tasks[task['id']]
+                    self.tasks[destination][task['id']] = task
+                self._top_position -= 1  # to the top of its new list
+                task['position'] = f'{self._top_position:020d}'
+                self._touch(task)
+                return 200, task
+            if method == 'GET':
+                return 200, task
+            if method in ('PUT', 'PATCH'):
+                for field in ('notes', 'due'):
+                    # PUT drops what it leaves out, PATCH what it sets to null
+                    if method == 'PUT' and field not in data or data.get(field, '') is None:
+                        task.pop(field, None)
+                for field in ('title', 'notes', 'due', 'status'):
+                    if data.get(field) is not None:
+                        task[field] = data[field]
+                self._touch(task)
+                return 200, task
+            if method == 'DELETE':
+                if task.get('deleted'):
+                    raise KeyError(task['id'])
+                task['deleted'] = True
+                self._touch(task)
+                return 204, None
+
+        raise KeyError('/'.join(segments))
+
+    def _visible(self, tasks, query):
+        show_completed = query.get('showCompleted', 'true') == 'true'
+        show_deleted = query.get('showDeleted', 'false') == 'true'
+        show_hidden = query.get('showHidden', 'false') == 'true'
+        updated_min = query.get('updatedMin')
+        return [t for t in tasks.values()
+                if (show_completed or t['status'] != 'completed')
+                and (show_deleted or not t.get('deleted'))
+                and (show_hidden or not t.get('hidden'))
+                and (updated_min is None or t['updated'] >= updated_min)]
+
+    def _page(self, kind, items, query, default_size):
+        size = min(int(query.get('maxResults', default_size)), self.max_page_size)
+        start = int(query.get('pageToken', 0))
+        page = {'kind': kind, 'items': items[start:start + size]}
+        if start + size < len(items):
+            page['nextPageToken'] = str(start + size)
+        page['etag'] = _etag(page)
+        return page
+
+    def _list_id(self, list_id):
+        if list_id == '@default':
+            return next(iter(self.lists))
+        return list_id
+
+    # --- batch ---------------------------------------------------------
+
+    def _batch(self, headers, body):
+        """answer a multipart/mixed batch, one application/http part per call"""
+        raw = b'Content-Type: ' + headers['content-type'].encode() + b'\r\n\r\n' + body
+        message = email.message_from_bytes(raw, policy=email.policy.compat32)
+        boundary = f'batch_{uuid.uuid4().hex}'
+        out = []
+        for part in message.get_payload():
+            content_id = part['Content-ID'].strip('<>')
+            method, uri, part_headers, part_body = _parse_http(part.get_payload())
+            status, call_headers, content = self.call(method, uri, part_headers, part_body)
+            call_headers['content-length'] = len(content)
+            head = [f'HTTP/1.1 {status} {REASONS.get(status, "")}']
+            head += [f'{name}: {value}' for name, value in call_headers.items()]
+            out.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\n'
+                f'Content-ID: <response-{content_id}>\r\n\r\n'
+                + '\r\n'.join(head) + '\r\n\r\n' + content.decode() + '\r\n')
+        content = (''.join(out) + f'--{boundary}--').encode()
+        return 200, {'content-type': f'multipart/mixed; boundary={boundary}'}, content
+
+    # --- errors, ids and clocks ----------------------------------------
+
+    def _injected_error(self):
+        if self._failures:
+            return self._failures.popleft()
+        if self.qpm is not None:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] > 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.qpm:
+                return 429
+            self._calls.append(now)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return self.error_status
+        return None
+
+    def _error(self, status):
+        message = REASONS.get(status, 'Error')
+        payload = {'error': {'code': status, 'message': message, 'errors': [
+            {'reason': ERROR_REASONS.get(status, 'error'), 'message': message}]}}
+        headers = {'content-type': 'application/json; charset=UTF-8'}
+        if status == 429:
+            headers['retry-after'] = str(self.retry_after)
+        return status, headers, json.dumps(payload).encode()
+
+    def _touch(self, resource):
+        resource['updated'] = self._now()
+        resource['etag'] = _etag(resource)
+
+    def _now(self):
+        # strictly increasing, so updatedMin never misses a change
+        now = max(datetime.now(timezone.utc), self._last_time + timedelta(milliseconds=1))
+        self._last_time = now
+        return now.strftime('%Y-%m-%dT%H:%M:%S.') + f'{now.microsecond // 1000:03d}Z'
+
+    def _new_id(self):
+        return uuid.UUID(int=self._rng.getrandbits(128)).hex[:22]
+
+
+class FakeHttp:
+    """the part of httplib2.Http that googleapiclient uses, answered by
+    a FakeTasksServer instead of the network"""
+
+    timeout = None
+
+    def __init__(self, server):
+        self.server = server
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if isinstance(body, str):
+            body = body.encode()
+        status, out_headers, content = self.server.request(method, uri, headers, body)
+        return httplib2.Response(dict(out_headers, status=str(status))), content
+
+
+def _etag(resource):
+    data = json.dumps({k: v for k, v in resource.items() if k != 'etag'}, sort_keys=True)
+    return '"' + hashlib.sha1(data.encode()).hexdigest()[:16] + '"'
+
+
+def _route(segments):
+    """the request path with ids blanked out, for the per-route counters"""
+    if segments[:3] == ['users', '@me', 'lists']:
+        return 'tasklists' if len(segments) == 3 else 'tasklist'
+    if segments[4:] == ['move']:
+        return 'task move'
+    return 'tasks' if len(segments) == 3 else 'task'
+
+
+def _parse_http(payload):
+    """split one batch part (an HTTP request as text) into its pieces"""
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    payload = payload.replace('\r\n', '\n')
+    head, _, body = payload.partition('\n\n')
+    lines = head.split('\n')
+    method, path, _ = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, path, headers, body.encode() if body.strip() else None
@@ -0,0 +1,186 @@
+"""Memory per task for the ways core.py could hold the tasks table.
+
+    python benchmarks/memory.py                 # 10k and 100k tasks
+    python benchmarks/memory.py --sizes 50000 --out memory.json
+
+For each size a fresh tasks.db is loaded with synthetic tasks (see
+synthetic.py), then the whole table is read back into each shape while
+tracemalloc counts what it allocates:
+
+    tuple         sqlite3's plain rows, what the readers used to return
+    dict          one dict per task, keyed by column
+    slots class   a class with __slots__ for the six columns
+    Task          core.Task, a NamedTuple
+    columns       one tuple per column (array-backed)
+    TaskSummary   what get_all_local_tasks() returns: core.TaskSummary
+                  records, notes left out
+
+It then pulls the same account from the fake Tasks API (fakeserver.py)
+into an empty tasks.db and reports the most memory the pull had
+allocated at any point, which should stay about the same whatever the
+account's size.
+
+"total" is what tracemalloc saw the whole table take, field strings
+included. "record" is what one task costs on top of its strings: the
+record's sys.getsizeof() plus its slot in the list (for columns, its
+six slots), or for TaskSummary its total less the strings it holds.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+
+import core  # noqa: E402
+import db  # noqa: E402
+import google_service  # noqa: E402
+from fakeserver import FakeTasksServer  # noqa: E402
+from storage import seed_tasklists  # noqa: E402
+from synthetic import make_tasklists, make_tasks  # noqa: E402
+
+
+class SlotsTask:
+    __slots__ = core.Task._fields
+
+    def __init__(self, id, title, list_name, due_time, notes, status):
+        self.id = id
+        self.title = title
+        self.list_name = list_name
+        self.due_time = due_time
+        self.notes = notes
+        self.status = status
+
+
+SHAPES = {
+    'tuple': lambda rows: rows,
+    'dict': lambda rows: [dict(zip(core.Task._fields, row)) for row in rows],
+    'slots class': lambda rows: [SlotsTask(*row) for row in rows],
+    'Task': lambda rows: [core.Task._make(row) for row in rows],
+    'columns': lambda rows: list(zip(*rows)),
+}
+
+
+def fetch_rows(columns=core.TASK_COLUMNS):
+    return db.get_connection(core.DB_FILE).execute(
+        f'SELECT {columns} FROM tasks').fetchall()
+
+
+def allocated(fn):
+    """bytes still allocated by what fn() returns, once it has returned"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn()  # noqa: F841 (kept alive until measured)
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def string_bytes(rows):
+    """bytes taken by the distinct str objects in `rows`"""
+    sizes = {id(value): sys.getsizeof(value)
+             for row in rows for value in row if isinstance(value, str)}
+    return sum(sizes.values())
+
+
+def peak(fn):
+    """the most bytes allocated at once while fn() ran"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_pull(size, lists, seed):
+    """peak bytes allocated by a first pull of a `size` task account"""
+    server = FakeTasksServer(seed=seed)
+    tasklists = make_tasklists(lists)
+    server.load(tasklists, make_tasks(size, tasklists, seed))
+    google_service.set_http_factory(server.http)
+    try:
+        core.initialize_database()
+        creds = Credentials(token='fake-token')
+        return peak(lambda: core.pull_from_google(creds))
+    finally:
+        google_service.set_http_factory(None)
+        core._forget_tasklist_ids()
+
+
+def bench_size(size, lists, seed):
+    core.initialize_database()
+    tasklists = make_tasklists(lists)
+    seed_tasklists(tasklists)
+    core.upsert_tasks(make_tasks(size, tasklists, seed))
+    strings = string_bytes(fetch_rows())
+
+    results = {}
+    rows = fetch_rows()
+    for name, shape in SHAPES.items():
+        total = allocated(lambda: shape(fetch_rows()))
+        if name == 'columns':
+            record = len(core.Task._fields) * 8
+        else:
+            record = sys.getsizeof(shape(rows[:1])[0]) + 8
+        results[name] = {'total': total / size, 'record': record}
+    total = allocated(core.get_all_local_tasks)
+    strings = string_bytes(fetch_rows(core.SUMMARY_COLUMNS))
+    results['TaskSummary'] = {'total': total / size, 'record': (total - strings) / size}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark-memory.json')
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    results = {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'sizes': {},
+    }
+    cwd = os.getcwd()
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)  # core keeps tasks.db in the working directory
+            try:
+                shapes = bench_size(size, args.lists, args.seed)
+            finally:
+                db.close_connection()
+                os.chdir(cwd)
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                pull_peak = bench_pull(size, args.lists, args.seed)
+            finally:
+                db.close_connection()
+                os.chdir(cwd)
+        results['sizes'][str(size)] = dict(shapes, pull={'peak': pull_peak})
+
+        print(f"\n{size} tasks, bytes per task")
+        for name, r in shapes.items():
+            print(f"  {name:12} total {r['total']:8.1f}   record {r['record']:8.1f}")
+        print(f"  pull peak    {pull_peak / 1024:8.0f} KB")
+
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nsaved {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Startup benchmark: import time of core and GUI, and time to first frame.
+
+    python benchmarks/startup.py            # print the numbers
+    python benchmarks/startup.py --check    # and exit 1 if over budget
+
+Import times come from `python -X importtime`, best of --runs fresh
+interpreters. Time to first frame is wall time from starting a new
+interpreter to taskApp's window being drawn, against an empty tasks.db
+in a temporary directory and with no token.json, i.e. an offline first
+launch. It needs a display; on Linux without $DISPLAY it is skipped
+(run it under xvfb-run).
+
+--check also fails if importing core pulls in any of the Google client
+libraries, which should only load once something talks to Google.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# budgets for --check, in milliseconds
+IMPORT_CORE_MS = 100
+IMPORT_GUI_MS = 400
+FIRST_FRAME_MS = 1500
+
+GOOGLE_MODULES = ('googleapiclient', 'google_auth_oauthlib', 'google_auth_httplib2',
+                  'google.oauth2', 'google.auth', 'httplib2')
+
+FIRST_FRAME_SCRIPT = '''
+import os, sys
+sys.path.insert(0, {root!r})
+import customtkinter as ctk
+import GUI
+root = ctk.CTk()
+GUI.taskApp(root)
+root.update()
+print("frame", flush=True)
+os._exit(0)
+'''
+
+
+def import_time(module, runs):
+    """best-of-`runs` cumulative import time of `module` in ms, and the
+    names of every module the import loaded"""
+    best, loaded = None, set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=ROOT, capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            _, cumulative, name = line.split('|')
+            name = name.strip()
+            loaded.add(name)
+            if name == module and cumulative.strip().isdigit():
+                ms = int(cumulative) / 1000
+                best = ms if best is None else min(best, ms)
+    return best, loaded
+
+
+def first_frame_time(runs):
+    """best-of-`runs` ms from spawning python to taskApp's first frame"""
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        return None
+    best = None
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            shutil.copy(os.path.join(ROOT, 'favicon.png'), workdir)
+            start = time.perf_counter()
+            child = subprocess.Popen(
+                [sys.executable, '-c', FIRST_FRAME_SCRIPT.format(root=ROOT)],
+                cwd=workdir, stdout=subprocess.PIPE, text=True)
+            line = child.stdout.readline()
+            ms = (time.perf_counter() - start) * 1000
+            child.wait()
+        if line.strip() != 'frame':
+            raise RuntimeError('taskApp exited before drawing a frame')
+        best = ms if best is None else min(best, ms)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--check', action='store_true',
+                        help='exit 1 if a budget is exceeded')
+    parser.add_argument('--json', metavar='PATH', help='also write the results here')
+    args = parser.parse_args()
+
+    core_ms, core_modules = import_time('core', args.runs)
+    gui_ms, _ = import_time('GUI', args.runs)
+    frame_ms = first_frame_time(args.runs)
+    google = [package for package in GOOGLE_MODULES
+              if any(name == package or name.startswith(package + '.')
+                     for name in core_modules)]
+
+    results = {
+        'import_core_ms': core_ms,
+        'import_gui_ms': gui_ms,
+        'first_frame_ms': frame_ms,
+        'google_modules_imported_by_core': google,
+    }
+    print(f"import core   {core_ms:8.1f} ms   (budget {IMPORT_CORE_MS})")
+    print(f"import GUI    {gui_ms:8.1f} ms   (budget {IMPORT_GUI_MS})")
+    if frame_ms is None:
+        print("first frame        skipped (no display)")
+    else:
+        print(f"first frame   {frame_ms:8.1f} ms   (budget {FIRST_FRAME_MS})")
+    if google:
+        print(f"core imported the Google stack: {', '.join(google)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check:
+        over = (core_ms > IMPORT_CORE_MS or gui_ms > IMPORT_GUI_MS
+                or (frame_ms is not None and frame_ms > FIRST_FRAME_MS))
+        if over or google:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
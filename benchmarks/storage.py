@@ -0,0 +1,239 @@
+"""Micro-benchmarks for core.py's storage layer and the GUI refresh.
+
+    python benchmarks/storage.py                       # 1k, 10k, 100k tasks
+    python benchmarks/storage.py --sizes 1000 10000 --out before.json
+    python benchmarks/storage.py --compare before.json # exit 1 on regressions
+
+For each size a fresh tasks.db is bulk loaded with synthetic tasks over
+--lists lists (see synthetic.py) in a temporary directory, then every
+operation is timed call by call and reported as ops/sec with p50/p99
+latency. Results are written as JSON; --compare reads an earlier run
+and flags any operation whose p50 got more than --tolerance slower.
+
+app.refresh needs a display. On Linux without $DISPLAY it runs under
+a virtual one via pyvirtualdisplay (pip install pyvirtualdisplay, plus
+Xvfb) and is skipped if that isn't installed.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import core  # noqa: E402
+import db  # noqa: E402
+from synthetic import make_task, make_tasklists, make_tasks  # noqa: E402
+
+BULK_CHUNK = 1000  # tasks per upsert_tasks() call in the bulk load
+
+
+def percentile(latencies, q):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def summarize(latencies, ops=None):
+    """ops/sec and p50/p99 (ms) of a list of per-call latencies in seconds;
+    `ops` is the number of operations if a call did more than one"""
+    total = sum(latencies)
+    ops = len(latencies) if ops is None else ops
+    return {
+        'calls': len(latencies),
+        'ops': ops,
+        'ops_per_sec': ops / total if total else None,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'total_s': total,
+    }
+
+
+def timed(fn, calls):
+    """call fn(i) for i in range(calls), returning each call's latency"""
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def seed_tasklists(tasklists):
+    with db.transaction(core.DB_FILE) as cursor:
+        cursor.executemany(
+            'INSERT INTO tasklists (id, title, etag, updated) VALUES (?, ?, ?, ?)',
+            [(t['id'], t['title'], t['etag'], t['updated']) for t in tasklists])
+
+
+def bench_size(size, lists, ops, reads, seed):
+    """time every storage operation against a fresh `size`-task database"""
+    core.initialize_database()
+    tasklists = make_tasklists(lists)
+    seed_tasklists(tasklists)
+    tasks = make_tasks(size, tasklists, seed)
+    rng = random.Random(seed)
+    results = {}
+
+    chunks = [tasks[i:i + BULK_CHUNK] for i in range(0, size, BULK_CHUNK)]
+    results['upsert_tasks (bulk load)'] = summarize(
+        timed(lambda i: core.upsert_tasks(chunks[i]), len(chunks)), ops=size)
+
+    extra = [make_task(rng, f'extra{i:07d}', rng.choice(tasklists)) for i in range(ops)]
+    results['insert_task_to_db'] = summarize(
+        timed(lambda i: core.insert_task_to_db(extra[i]), ops))
+
+    results['add_local_task'] = summarize(timed(
+        lambda i: core.add_local_task(f'Local task {i}', rng.choice(tasklists)['title'],
+                                      '2024-06-01', 'added by the benchmark'), ops))
+
+    ids = [task['id'] for task in rng.sample(tasks, min(ops, size))]
+    results['update_local_task'] = summarize(timed(
+        lambda i: core.update_local_task(ids[i % len(ids)], title=f'Edited {i}',
+                                         status=rng.choice(('completed', 'needsAction'))),
+        ops))
+
+    results['get_task_by_id'] = summarize(
+        timed(lambda i: core.get_task_by_id(ids[i % len(ids)]), ops))
+
+    results['get_all_local_tasks'] = summarize(
+        timed(lambda i: core.get_all_local_tasks(), reads))
+
+    # every page of the list, top to bottom, in each order
+    for order in core.ORDERS:
+        latencies = []
+        key = None
+        while True:
+            start = time.perf_counter()
+            _, key = core.query_tasks(order, key)
+            latencies.append(time.perf_counter() - start)
+            if key is None:
+                break
+        results[f'query_tasks page ({order})'] = summarize(latencies)
+
+    return results
+
+
+def bench_refresh(repeats):
+    """time app.refresh() until the reloaded list is drawn, or None
+    without a display. The load runs on the app's db thread and is
+    handed over at the next frame, so this includes up to a frame of
+    waiting (app.frame_ms)."""
+    display = None
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        try:
+            from pyvirtualdisplay import Display
+        except ImportError:
+            return None
+        display = Display(visible=False, size=(700, 500))
+        display.start()
+    try:
+        import customtkinter as ctk
+        import GUI
+
+        root = ctk.CTk()
+        window = GUI.app(root)
+        window.framing()
+        root.update()
+
+        def refresh(i):
+            window.tasks = None
+            window.refresh()
+            while window.tasks is None:
+                root.update()
+            root.update_idletasks()
+
+        latencies = timed(refresh, repeats)
+        root.destroy()
+        return summarize(latencies)
+    finally:
+        if display is not None:
+            display.stop()
+
+
+def compare(results, baseline, tolerance):
+    """print p50 changes against `baseline`; returns the regressions"""
+    regressions = []
+    for size, ops in results['sizes'].items():
+        for name, now in ops.items():
+            before = baseline.get('sizes', {}).get(size, {}).get(name)
+            if not before:
+                continue
+            ratio = now['p50_ms'] / before['p50_ms'] if before['p50_ms'] else 1.0
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = '  <-- slower'
+                regressions.append((size, name, ratio))
+            print(f"{size:>8} {name:28} p50 {before['p50_ms']:9.3f} -> "
+                  f"{now['p50_ms']:9.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--ops', type=int, default=1000,
+                        help='calls per single-task operation')
+    parser.add_argument('--reads', type=int, default=20,
+                        help='calls of get_all_local_tasks and app.refresh')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark-storage.json')
+    parser.add_argument('--compare', metavar='BASELINE')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='p50 slowdown allowed by --compare (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    out = os.path.abspath(args.out)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'args': vars(args),
+        'sizes': {},
+    }
+    cwd = os.getcwd()
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)  # core keeps tasks.db in the working directory
+            try:
+                ops = bench_size(size, args.lists, args.ops, args.reads, args.seed)
+                refresh = bench_refresh(args.reads)
+                if refresh is not None:
+                    ops['app.refresh'] = refresh
+            finally:
+                db.close_connection()
+                os.chdir(cwd)
+        results['sizes'][str(size)] = ops
+
+        print(f"\n{size} tasks")
+        for name, r in ops.items():
+            print(f"  {name:28} {r['ops_per_sec']:12,.0f} ops/s   "
+                  f"p50 {r['p50_ms']:9.3f} ms   p99 {r['p99_ms']:9.3f} ms")
+        if 'app.refresh' not in ops:
+            print("  app.refresh                  skipped (no display)")
+
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nsaved {out}")
+
+    if baseline is not None:
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
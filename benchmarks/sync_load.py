@@ -0,0 +1,184 @@
+"""Sync load test against the in-process fake Tasks API (fakeserver.py).
+
+    python benchmarks/sync_load.py
+    python benchmarks/sync_load.py --sizes 1000 10000 --edits 0 100 1000 \\
+        --latency 0.08 --error-rate 0.01 --out sync.json
+
+For every account size and offline-edit count it starts from an empty
+tasks.db and an account of --lists lists holding `size` tasks, then
+times what taskApp.sync does (pull_from_google, then
+push_local_tasks_to_google) through these phases:
+
+    first sync    empty db, nothing to push
+    edited sync   after `edits` offline changes here (adds, edits,
+                  deletes) and --remote-edits changes on "another device"
+    idle sync     nothing changed anywhere
+    full fetch    get_tasks_online(), for comparison
+
+Each phase reports wall time, HTTP round trips, API calls and bytes
+(the JSON also has core's phase timers and counters for it), and the
+run checks that the db and the server agree at the end, task for task
+and on each one's title, list and status. No
+network is used; --latency stands in for it.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+
+import core  # noqa: E402
+import db  # noqa: E402
+import google_service  # noqa: E402
+import metrics  # noqa: E402
+import scheduler  # noqa: E402
+from fakeserver import FakeTasksServer  # noqa: E402
+from synthetic import make_tasklists, make_tasks  # noqa: E402
+
+
+def offline_edits(count, tasklists, rng):
+    """make `count` local changes: 40% new tasks, 30% edits, 10% moves
+    to another list, 20% deletes"""
+    ids = [task[0] for task in core.get_all_local_tasks()]
+    rng.shuffle(ids)
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.4 or not ids:
+            core.add_local_task(f'Offline task {i}', rng.choice(tasklists)['title'],
+                                '', 'added offline')
+        elif kind < 0.7:
+            core.update_local_task(ids.pop(), title=f'Edited offline {i}',
+                                   status=rng.choice(('completed', 'needsAction')))
+        elif kind < 0.8:  # moved to another list
+            core.update_local_task(ids.pop(), list_name=rng.choice(tasklists)['title'])
+        else:
+            core.delete_syncable_task(ids.pop())
+
+
+def measure(server, fn):
+    """run fn() and return its wall time, what it cost on the server and
+    core's own timers and counters (metrics.py)"""
+    before = dict(server.stats)
+    metrics.reset()
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    cost = {key: value - before.get(key, 0) for key, value in server.stats.items()}
+    return {
+        'seconds': seconds,
+        'http_requests': cost.get('http_requests', 0),
+        'api_calls': cost.get('api_calls', 0),
+        'bytes_out': cost.get('bytes_out', 0),
+        'bytes_in': cost.get('bytes_in', 0),
+        'errors': sum(v for k, v in cost.items() if k.startswith('errors_')),
+        'metrics': metrics.snapshot(),
+    }
+
+
+def run_scenario(size, edits, args):
+    server = FakeTasksServer(latency=args.latency, jitter=args.jitter,
+                             error_rate=args.error_rate, qpm=args.qpm, seed=args.seed)
+    tasklists = make_tasklists(args.lists)
+    server.load(tasklists, make_tasks(size, tasklists, args.seed))
+    google_service.set_http_factory(server.http)
+    creds = Credentials(token='fake-token')  # never expires, never refreshed
+    rng = random.Random(args.seed)
+
+    def sync():
+        budget = scheduler.RetryBudget()  # one per sync, as taskApp.sync does
+        core.pull_from_google(creds, budget=budget)
+        core.push_local_tasks_to_google(creds, budget)
+
+    core.initialize_database()
+    phases = {'first sync': measure(server, sync)}
+    offline_edits(edits, tasklists, rng)
+    server.edit_tasks(args.remote_edits)
+    phases['edited sync'] = measure(server, sync)
+    phases['idle sync'] = measure(server, sync)
+    phases['full fetch'] = measure(
+        server, lambda: collections.deque(core.get_tasks_online(creds), maxlen=0))
+
+    local = {task.id: (task.title, task.list_name, task.status)
+             for task in core.get_all_local_tasks()}
+    remote = {task_id: (task['title'], server.lists[list_id]['title'], task['status'])
+              for list_id, tasks in server.tasks.items()
+              for task_id, task in tasks.items() if not task.get('deleted')}
+    return {
+        'phases': phases,
+        'consistent': local == remote,
+        'local_tasks': len(local),
+        'remote_tasks': len(remote),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--edits', type=int, nargs='+', default=[0, 50, 500],
+                        help='offline changes made before the second sync')
+    parser.add_argument('--remote-edits', type=int, default=20)
+    parser.add_argument('--lists', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per HTTP round trip')
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='share of API calls answered with a 429')
+    parser.add_argument('--qpm', type=int, help='API calls allowed per minute')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='benchmark-sync.json')
+    parser.add_argument('--log-level', default='CRITICAL',
+                        help="core's log level, e.g. INFO (injected errors log tracebacks)")
+    args = parser.parse_args()
+    metrics.setup_logging(args.log_level)
+
+    out = os.path.abspath(args.out)
+    results = {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'scenarios': [],
+    }
+    cwd = os.getcwd()
+    try:
+        for size in args.sizes:
+            for edits in args.edits:
+                with tempfile.TemporaryDirectory() as workdir:
+                    os.chdir(workdir)  # core keeps tasks.db in the working directory
+                    try:
+                        scenario = run_scenario(size, edits, args)
+                    finally:
+                        db.close_connection()
+                        core._forget_tasklist_ids()
+                        os.chdir(cwd)
+                scenario.update(size=size, edits=edits)
+                results['scenarios'].append(scenario)
+
+                print(f"\n{size} tasks, {edits} offline edits"
+                      f"{'' if scenario['consistent'] else '   ** db and server differ **'}")
+                for name, p in scenario['phases'].items():
+                    print(f"  {name:12} {p['seconds']:8.2f} s  {p['http_requests']:5} round trips  "
+                          f"{p['api_calls']:5} calls  {p['bytes_out'] / 1024:9.1f} KB down  "
+                          f"{p['errors']:3} errors")
+    finally:
+        google_service.set_http_factory(None)
+
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nsaved {out}")
+    if not all(s['consistent'] for s in results['scenarios']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Synthetic accounts for the benchmarks: task lists and tasks shaped
+like the ones get_tasks_online() yields, reproducible from a seed."""
+import random
+from datetime import datetime, timedelta, timezone
+
+WORDS = (
+    'buy call email book pay fix clean plan review write send check order '
+    'renew cancel schedule finish start update read draft print sign file '
+    'milk bread eggs coffee rent invoice report slides dentist doctor gym '
+    'car insurance taxes passport visa flight hotel garden laundry budget '
+    'meeting project client team mom dad birthday gift party library bank'
+).split()
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _rfc3339(moment):
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def make_tasklists(count):
+    """`count` task lists as the tasklists endpoint returns them"""
+    return [{'id': f'list{i:04d}', 'title': f'List {i}', 'etag': f'"l{i}"',
+             'updated': _rfc3339(EPOCH)} for i in range(count)]
+
+
+def make_task(rng, task_id, tasklist):
+    """one task dict in the shape get_tasks_online() yields"""
+    due = EPOCH + timedelta(days=rng.randrange(365))
+    return {
+        'id': task_id,
+        'title': ' '.join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize(),
+        'due': _rfc3339(due) if rng.random() < 0.6 else 'No due date',
+        'status': 'completed' if rng.random() < 0.3 else 'needsAction',
+        'notes': ' '.join(rng.choices(WORDS, k=rng.randint(5, 30))) if rng.random() < 0.4 else '',
+        'updated': _rfc3339(EPOCH + timedelta(seconds=rng.randrange(10 ** 7))),
+        'deleted': False,
+        'list_name': tasklist['title'],
+        'list_id': tasklist['id'],
+        'position': f'{rng.randrange(10 ** 20):020d}',
+    }
+
+
+def make_tasks(count, tasklists, seed=0):
+    """`count` tasks spread unevenly over `tasklists` (a few big lists,
+    many small ones, like a real account)"""
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(tasklists))]
+    homes = rng.choices(tasklists, weights, k=count)
+    return [make_task(rng, f'task{i:07d}', tasklist) for i, tasklist in enumerate(homes)]
@@ -9,15 +9,24 @@ synced to my google account. not even a personal assistant. Not yet.
 
 Just sync google tasks. Just be clear."""
 import uuid
-import sqlite3
+import json
+import logging
 import os
+import queue
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
 
+import metrics
+import scheduler
+from db import after_commit, get_connection, migrate, transaction
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+# The google client libraries are imported inside the functions that talk
+# to Google. Together they take around 300ms to import, and an offline
+# start (open the app, read tasks from tasks.db) never needs them.
 
 
 SCOPES = ['https://www.googleapis.com/auth/tasks']
@@ -26,7 +35,100 @@ TOKEN_PATH = 'token.json'
 CREDENTIALS_PATH = 'credentials.json'
 
 
+
+class Task(NamedTuple):
+    """A task, notes and all, as get_task_by_id returns it. It's a tuple
+    underneath (__slots__ = ()), so it unpacks like the plain rows did
+    and is the same size, 88 bytes against 272 for a dict with these
+    keys (benchmarks/memory.py), but the fields have names."""
+    id: str
+    title: str
+    list_name: str
+    due_time: str
+    notes: str
+    status: str
+
+
+class TaskSummary(NamedTuple):
+    """A task as the list shows it: everything but the notes, which can
+    be any size. Opening a task loads them (get_task_by_id)."""
+    id: str
+    title: str
+    list_name: str
+    due_time: str
+    status: str
+
+
+TASK_COLUMNS = ', '.join(Task._fields)
+SUMMARY_COLUMNS = ', '.join(TaskSummary._fields)
+
+# the orders query_tasks() offers, each the key it sorts on. Every key
+# ends in id so it's unique, and has an index of its own
+# (_migrate_ordering), so a page is one seek into it. due_key and done
+# are generated columns: due dates with no due date last, open tasks
+# before completed ones.
+ORDERS = {
+    'position': ('list_name', 'position', 'id'),  # Google's own order
+    'due_time': ('due_key', 'id'),
+    'status': ('done', 'due_key', 'id'),
+    'list': ('list_name', 'due_key', 'id'),
+}
+PAGE_SIZE = 100
+UPSERT_CHUNK = 500  # ids per lookup, well under SQLite's variable limit
+
+# page sizes are the API maximums; fields= keeps only what we store
+TASKS_PAGE_SIZE = 100
+TASKLISTS_PAGE_SIZE = 1000
+TASK_FIELDS = ('etag,nextPageToken,'
+               'items(id,title,due,status,notes,position,updated,deleted,hidden)')
+TASKLIST_FIELDS = 'etag,nextPageToken,items(id,title,etag,updated)'
+
+# lists are fetched this many at a time; kept small so a sync stays
+# well under the per-user queries-per-second quota
+FETCH_WORKERS = 4
+# pulled pages wait for the writer in a queue this many deep, and it
+# writes them WRITE_CHUNK tasks to a transaction
+PIPELINE_DEPTH = 2 * FETCH_WORKERS
+WRITE_CHUNK = 500
+
+# writes go through the batch endpoint, this many per HTTP call
+BATCH_SIZE = 50
+# the columns a local edit can change and the API fields they patch;
+# list_name isn't one, a task changes list with tasks.move
+PATCH_FIELDS = {'title': 'title', 'due_time': 'due', 'notes': 'notes', 'status': 'status'}
+EDITABLE = (*PATCH_FIELDS, 'list_name')
+
+# Google only keeps deleted tasks around for a while, so a delta pull
+# against a list we last synced longer ago than this could miss deletions
+DELTA_MAX_AGE = timedelta(days=14)
+
+# requests/bytes spent by the last get_tasks_online() call
+last_fetch_stats = {'requests': 0, 'bytes': 0, 'gzipped': 0}
+
+# what a conditional request returns when Google says nothing changed
+NOT_MODIFIED = object()
+
+_fetch_pool = None
+_fetch_pool_lock = threading.Lock()
+
+# callbacks told about every committed change to the tasks table
+_listeners = []
+# and the ones told when local changes were queued for a push
+_outbox_listeners = []
+
+# title -> id of every known list, read from the tasklists table when
+# first needed and again only after a pull saw the lists change
+_tasklist_ids = None
+_tasklist_ids_lock = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+
 def get_google_credentials():
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     if os.path.exists(TOKEN_PATH):
         creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
@@ -42,320 +144,1454 @@ def get_google_credentials():
     return creds
 
 
-def initialize_database():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def get_service(creds):
+    """this thread's Tasks client, see google_service.py"""
+    import google_service
+    return google_service.get_service(creds)
+
+
+def _migrate_base(cursor):
+    """the schema as it stood before versioning, for new and old files alike"""
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS tasks (
             id TEXT PRIMARY KEY, title TEXT NOT NULL, list_name TEXT NOT NULL,
-            due_time TEXT, notes TEXT, status TEXT NOT NULL
+            due_time TEXT, notes TEXT, status TEXT NOT NULL,
+            content_hash TEXT
+        )
+    ''')
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(tasks)')]
+    if 'content_hash' not in columns:
+        cursor.execute('ALTER TABLE tasks ADD COLUMN content_hash TEXT')
+    # watermark is the newest `updated` seen in the list
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasklists (
+            id TEXT PRIMARY KEY, title TEXT NOT NULL, etag TEXT,
+            watermark TEXT, synced_at TEXT
         )
     ''')
-    conn.commit()
-    conn.close()
 
 
-def get_all_task_lists():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT DISTINCT list_name FROM tasks')
-    lists = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return lists
+def _migrate_sync_state(cursor):
+    """sync_state says what a push owes Google for a row: 'local' rows
+    were never pushed, 'dirty' ones were edited since the last sync"""
+    cursor.execute(
+        "ALTER TABLE tasks ADD COLUMN sync_state TEXT NOT NULL DEFAULT 'synced'")
+    cursor.execute("UPDATE tasks SET sync_state = 'local' WHERE id LIKE 'local-%'")
+    # the completed rows the old update_google_tasks_from_local would resend
+    cursor.execute(
+        "UPDATE tasks SET sync_state = 'dirty' "
+        "WHERE id NOT LIKE 'local-%' AND status = 'completed'")
+    cursor.execute('CREATE INDEX idx_tasks_list_name ON tasks (list_name)')
+    cursor.execute(
+        "CREATE INDEX idx_tasks_local ON tasks (id) WHERE sync_state = 'local'")
+    cursor.execute(
+        "CREATE INDEX idx_tasks_dirty ON tasks (id) WHERE sync_state = 'dirty'")
+
+
+def _migrate_outbox(cursor):
+    """the outbox holds the local changes a push still owes Google, one
+    entry per task (see _enqueue)"""
+    cursor.execute('''
+        CREATE TABLE outbox (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id TEXT NOT NULL, op TEXT NOT NULL,
+            list_name TEXT, queued_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_outbox_task ON outbox (task_id)')
+    now = datetime.now(timezone.utc).isoformat()
+    cursor.execute(
+        "INSERT INTO outbox (task_id, op, queued_at) "
+        "SELECT id, CASE sync_state WHEN 'local' THEN 'insert' ELSE 'update' END, ? "
+        "FROM tasks WHERE sync_state IN ('local', 'dirty')", (now,))
+
+
+def _migrate_etags(cursor):
+    """ETags of the last list responses, for conditional requests:
+    tasks_etag per list, the tasklists collection's in sync_meta"""
+    cursor.execute('ALTER TABLE tasklists ADD COLUMN tasks_etag TEXT')
+    cursor.execute(
+        'CREATE TABLE sync_meta (key TEXT PRIMARY KEY, value TEXT)')
+
+
+def _migrate_tasklist_ids(cursor):
+    """tasks point at their list by id; list_name stays for display"""
+    cursor.execute('ALTER TABLE tasklists ADD COLUMN updated TEXT')
+    cursor.execute(
+        'ALTER TABLE tasks ADD COLUMN list_id TEXT '
+        'REFERENCES tasklists (id) ON DELETE SET NULL')
+    cursor.execute(
+        'UPDATE tasks SET list_id = '
+        '(SELECT id FROM tasklists WHERE tasklists.title = tasks.list_name)')
+    cursor.execute('CREATE INDEX idx_tasks_list_id ON tasks (list_id)')
+    cursor.execute('ALTER TABLE outbox ADD COLUMN list_id TEXT')
+    cursor.execute(
+        "UPDATE outbox SET list_id = "
+        "(SELECT id FROM tasklists WHERE tasklists.title = outbox.list_name) "
+        "WHERE op = 'delete'")
+
+
+def _migrate_search(cursor):
+    """full-text index over title and notes, kept in step with tasks by
+    triggers. It points at rows by rowid, as ids change when a push
+    swaps them; see _migrate_task_seq for why that rowid is a column."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE tasks_fts USING fts5 (
+            title, notes, content='tasks', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, title, notes)
+            VALUES (new.rowid, new.title, new.notes);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, notes)
+            VALUES ('delete', old.rowid, old.title, old.notes);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_update AFTER UPDATE OF title, notes ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, notes)
+            VALUES ('delete', old.rowid, old.title, old.notes);
+            INSERT INTO tasks_fts (rowid, title, notes)
+            VALUES (new.rowid, new.title, new.notes);
+        END
+    ''')
+    cursor.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _migrate_ordering(cursor):
+    """Google's position, the sort keys of ORDERS and an index for each
+    order. Every list is pulled in full once more to fill in position."""
+    cursor.execute("ALTER TABLE tasks ADD COLUMN position TEXT NOT NULL DEFAULT ''")
+    cursor.execute(
+        "ALTER TABLE tasks ADD COLUMN due_key TEXT GENERATED ALWAYS AS "
+        "(ifnull(nullif(nullif(due_time, 'No due date'), ''), '~')) VIRTUAL")
+    cursor.execute(
+        "ALTER TABLE tasks ADD COLUMN done INTEGER GENERATED ALWAYS AS "
+        "(status = 'completed') VIRTUAL")
+    cursor.execute('DROP INDEX idx_tasks_list_name')  # idx_tasks_by_list starts with it
+    cursor.execute('CREATE INDEX idx_tasks_by_position ON tasks (list_name, position, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_due_time ON tasks (due_key, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_status ON tasks (done, due_key, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_list ON tasks (list_name, due_key, id)')
+    cursor.execute('UPDATE tasklists SET watermark = NULL, tasks_etag = NULL')
+    cursor.execute("DELETE FROM sync_meta WHERE key = 'tasklists_etag'")
+
+
+def _migrate_dirty_fields(cursor):
+    """outbox.fields says which columns of an 'update' were edited here,
+    when, and what they held before: JSON like {"title":
+    ["2024-05-01T09:30:00+00:00", "Buy milk"], ...}. Entries queued
+    before it have only a time or nothing, see _merge_edits."""
+    cursor.execute('ALTER TABLE outbox ADD COLUMN fields TEXT')
+    # every update queued before this came from _migrate_outbox's
+    # completed rows, which only ever owed Google the status (all the
+    # old push sent). Left NULL they'd count as edits of every field.
+    cursor.execute(
+        "UPDATE outbox SET fields = json_object('status', queued_at) "
+        "WHERE op = 'update'")
+
+
+def _migrate_pulled_at(cursor):
+    """pulled_at stamps the rows a full resync of their list brought
+    back, so the ones it didn't can be found without keeping their ids"""
+    cursor.execute('ALTER TABLE tasks ADD COLUMN pulled_at TEXT')
+
+
+def _migrate_drop_state_indexes(cursor):
+    """the push reads the outbox, not sync_state, so nothing looks rows
+    up by it any more and its two partial indexes only slow writes"""
+    cursor.execute('DROP INDEX IF EXISTS idx_tasks_local')
+    cursor.execute('DROP INDEX IF EXISTS idx_tasks_dirty')
+
+
+def _migrate_task_seq(cursor):
+    """tasks gets seq, an INTEGER PRIMARY KEY. That makes it the rowid,
+    which the search index points at and search pages by: a bare rowid
+    is SQLite's to renumber (VACUUM may), one that is a column isn't.
+    It can't be added in place, so the table is rebuilt with every row
+    keeping its rowid as seq, which leaves the search index valid."""
+    cursor.execute('''
+        CREATE TABLE tasks_new (
+            seq INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL, list_name TEXT NOT NULL,
+            due_time TEXT, notes TEXT, status TEXT NOT NULL, content_hash TEXT,
+            sync_state TEXT NOT NULL DEFAULT 'synced',
+            list_id TEXT REFERENCES tasklists (id) ON DELETE SET NULL,
+            position TEXT NOT NULL DEFAULT '',
+            due_key TEXT GENERATED ALWAYS AS
+                (ifnull(nullif(nullif(due_time, 'No due date'), ''), '~')) VIRTUAL,
+            done INTEGER GENERATED ALWAYS AS (status = 'completed') VIRTUAL,
+            pulled_at TEXT
+        )
+    ''')
+    columns = ('id, title, list_name, due_time, notes, status, content_hash, '
+               'sync_state, list_id, position, pulled_at')
+    cursor.execute(
+        f'INSERT INTO tasks_new (seq, {columns}) SELECT rowid, {columns} FROM tasks')
+    cursor.execute('DROP TABLE tasks')  # its indexes and triggers with it
+    cursor.execute('ALTER TABLE tasks_new RENAME TO tasks')
+    cursor.execute('CREATE INDEX idx_tasks_list_id ON tasks (list_id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_position ON tasks (list_name, position, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_due_time ON tasks (due_key, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_status ON tasks (done, due_key, id)')
+    cursor.execute('CREATE INDEX idx_tasks_by_list ON tasks (list_name, due_key, id)')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts (rowid, title, notes)
+            VALUES (new.seq, new.title, new.notes);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, notes)
+            VALUES ('delete', old.seq, old.title, old.notes);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER tasks_fts_update AFTER UPDATE OF title, notes ON tasks BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, notes)
+            VALUES ('delete', old.seq, old.title, old.notes);
+            INSERT INTO tasks_fts (rowid, title, notes)
+            VALUES (new.seq, new.title, new.notes);
+        END
+    ''')
+
+
+# MIGRATIONS[i] takes a version i database to i + 1; only ever append
+MIGRATIONS = [
+    _migrate_base,
+    _migrate_sync_state,
+    _migrate_outbox,
+    _migrate_etags,
+    _migrate_tasklist_ids,
+    _migrate_search,
+    _migrate_ordering,
+    _migrate_dirty_fields,
+    _migrate_pulled_at,
+    _migrate_drop_state_indexes,
+    _migrate_task_seq,
+]
+
+
+def initialize_database():
+    migrate(DB_FILE, MIGRATIONS)
+
+
+def _get_tasklist_ids():
+    """title -> id for every list we know of"""
+    global _tasklist_ids
+    with _tasklist_ids_lock:
+        if _tasklist_ids is None:
+            _tasklist_ids = dict(get_connection(DB_FILE).execute(
+                'SELECT title, id FROM tasklists ORDER BY rowid'))
+        return _tasklist_ids
+
 
+def _forget_tasklist_ids():
+    global _tasklist_ids
+    with _tasklist_ids_lock:
+        _tasklist_ids = None
 
-def get_tasks_online(creds, show_completed=False):
-    service = build('tasks', 'v1', credentials=creds)
-    all_tasks = []
 
+def get_all_task_lists():
+    cursor = get_connection(DB_FILE).execute('SELECT DISTINCT list_name FROM tasks')
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _execute(request, stats, etag=None, budget=None):
+    """execute an API request asking for a gzipped body, and count
+    the requests and bytes it cost in `stats`. The request is paced
+    and retried by scheduler.call() against `budget`.
+
+    With `etag` the request is conditional (If-None-Match): if Google
+    answers 304, or with that same ETag, NOT_MODIFIED comes back
+    without the body being parsed."""
+    request.headers['accept-encoding'] = 'gzip'
+    user_agent = request.headers.get('user-agent', '')
+    if not user_agent.endswith('(gzip)'):
+        request.headers['user-agent'] = f'{user_agent} (gzip)'.strip()
+    if etag is not None:
+        request.headers['if-none-match'] = etag
+    else:
+        request.headers.pop('if-none-match', None)
+    # list_next() copies the previous request, wrapper included
+    postproc = getattr(request.postproc, 'inner', request.postproc)
+
+    def counting_postproc(resp, content):
+        stats['requests'] += 1
+        stats['bytes'] += len(content)
+        metrics.count('api_calls')
+        metrics.count('bytes', len(content))
+        if '-content-encoding' in resp:  # httplib2 already gunzipped it
+            stats['gzipped'] += 1
+        if etag is not None and resp.get('etag') == etag:
+            return NOT_MODIFIED
+        result = postproc(resp, content)
+        if resp.get('etag'):
+            result['etag'] = resp['etag']
+        return result
+
+    counting_postproc.inner = postproc
+    request.postproc = counting_postproc
+    from googleapiclient.errors import HttpError
     try:
-        tasklists = service.tasklists().list().execute().get('items', [])
-        if not tasklists:
-            print("No task lists found.")
-            return []
+        return scheduler.call(request.execute, budget)
+    except HttpError as e:
+        if etag is not None and e.resp.status == 304:
+            stats['requests'] += 1
+            metrics.count('api_calls')
+            return NOT_MODIFIED
+        raise
+
+
+def _list_pages(collection, stats, etag=None, budget=None, **kwargs):
+    """yield each page of a list() call, following nextPageToken. With
+    `etag` the first page is conditional and may be NOT_MODIFIED.
+    A failed page is retried on its own, the pages before it stand."""
+    request = collection.list(**kwargs)
+    while request is not None:
+        result = _execute(request, stats, etag, budget)
+        yield result
+        if result is NOT_MODIFIED:
+            return
+        etag = None
+        request = collection.list_next(request, result)
+
+
+def _list_all(collection, stats, **kwargs):
+    """yield every item of a list() call, following nextPageToken"""
+    for page in _list_pages(collection, stats, **kwargs):
+        yield from page.get('items', [])
+
+
+def _tasklist_pages(service, tasklist, stats, since=None, show_completed=False, etag=None,
+                    budget=None):
+    """yield the tasks of one list a page at a time, as (tasks, the
+    page's ETag). With `since`, only tasks updated after it come back,
+    deleted and hidden ones included. When `etag` is given and Google
+    says the result hasn't changed, NOT_MODIFIED is all that comes."""
+    params = {'showCompleted': show_completed}
+    if since is not None:
+        params = {'updatedMin': since, 'showCompleted': True,
+                  'showDeleted': True, 'showHidden': True}
+
+    for page in _list_pages(service.tasks(), stats, etag=etag, budget=budget,
+                            tasklist=tasklist['id'], maxResults=TASKS_PAGE_SIZE,
+                            fields=TASK_FIELDS, **params):
+        if page is NOT_MODIFIED:
+            yield NOT_MODIFIED
+            return
+        yield [_normalize(task, tasklist) for task in page.get('items', [])], page.get('etag')
+
+
+def _normalize(task, tasklist):
+    """an API task resource as the dict upsert_tasks() takes"""
+    return {
+        'id': task.get('id'),
+        'title': task.get('title', '[No title]'),
+        'due': task.get('due', 'No due date'),
+        'status': task.get('status'),
+        'notes': task.get('notes', ''),
+        'position': task.get('position', ''),
+        'updated': task.get('updated'),
+        'deleted': task.get('deleted', False) or task.get('hidden', False),
+        'list_name': tasklist['title'],
+        'list_id': tasklist['id']
+    }
+
+
+def _stream_tasklists(creds, jobs, stats, workers=None, budget=None):
+    """Fetch several lists at once and yield their pages as they come
+    in. `jobs` is a list of (tasklist, since, show_completed, etag);
+    what comes out is (i, kind, value) for jobs[i]:
+
+        (i, 'page', tasks)       the next page of its tasks
+        (i, 'done', etag)        that was the last page. The etag is
+                                 only set when one page held the whole
+                                 list, a page's ETag covers just that page
+        (i, 'unchanged', None)   Google says nothing changed since `etag`
+        (i, 'failed', exception) it still failed after its retries
+
+    Each list's pages come in order, but the lists' are interleaved.
+    They pass through a queue PIPELINE_DEPTH pages deep: a fetch that
+    gets ahead of whoever is consuming this waits for it, so however
+    big the account only a few pages are ever held, and the fetches
+    carry on over the network while the last pages are written.
+
+    The pool (and so each worker's client and open connection) lives
+    for the whole session; `workers` only caps how many lists are in
+    flight at a time."""
+    global _fetch_pool
+    with _fetch_pool_lock:
+        if _fetch_pool is None:
+            _fetch_pool = ThreadPoolExecutor(
+                max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+    in_flight = threading.BoundedSemaphore(workers or FETCH_WORKERS)
+    pages = queue.Queue(PIPELINE_DEPTH)
+    stopped = threading.Event()  # the consumer went away
+    job_stats = [{'requests': 0, 'bytes': 0, 'gzipped': 0} for _ in jobs]
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch(i):
+        tasklist, since, show_completed, etag = jobs[i]
+        if stopped.is_set():
+            return
+        with in_flight, metrics.timer('fetch tasks'):
+            etags = []
+            try:
+                for page in _tasklist_pages(get_service(creds), tasklist, job_stats[i],
+                                            since=since, show_completed=show_completed,
+                                            etag=etag, budget=budget):
+                    if page is NOT_MODIFIED:
+                        put((i, 'unchanged', None))
+                        return
+                    tasks, page_etag = page
+                    etags.append(page_etag)
+                    if not put((i, 'page', tasks)):
+                        return
+            except Exception as e:
+                put((i, 'failed', e))
+                return
+            put((i, 'done', etags[0] if len(etags) == 1 else None))
+
+    for i in range(len(jobs)):
+        _fetch_pool.submit(fetch, i)
+    try:
+        left = len(jobs)
+        while left:
+            item = pages.get()
+            if item[1] != 'page':
+                left -= 1
+                for key, value in job_stats[item[0]].items():
+                    stats[key] += value
+            yield item
+    finally:
+        stopped.set()
+
+
+def get_tasks_online(creds, show_completed=False, workers=None, budget=None):
+    """Yield every task in the account, list by list in Google's order
+    of the lists and each list's own order, a page at a time, so the
+    result is the same whichever fetch finishes first.
+
+    The lists are still fetched at once: pages of a list further on
+    wait in a buffer of their own until the lists before it are done.
+    A list that can't be fetched is logged rather than costing the
+    rest; if it fails part way through its earlier pages may already
+    have been yielded, only what was still buffered is dropped."""
+    service = get_service(creds)
+    budget = budget or scheduler.RetryBudget()
+    stats = {'requests': 0, 'bytes': 0, 'gzipped': 0}
+    count = 0
 
-        for tl in tasklists:
-            list_id = tl['id']
-            list_name = tl['title']
-            # print(f"\nTask List: {list_name}")
-
-            tasks_result = service.tasks().list(
-                tasklist=list_id,
-                showCompleted=show_completed
-            ).execute()
-
-            tasks = tasks_result.get('items', [])
-            if not tasks:
-                # print("  (No tasks)")
+    try:
+        with metrics.timer('fetch lists'):
+            tasklists = list(_list_all(
+                service.tasklists(), stats, budget=budget,
+                maxResults=TASKLISTS_PAGE_SIZE, fields=TASKLIST_FIELDS))
+        if not tasklists:
+            log.info("No task lists found.")
+            return
+
+        jobs = [(tl, None, show_completed, None) for tl in tasklists]
+        waiting = [[] for _ in jobs]  # pages of the lists after `current`
+        finished = [False] * len(jobs)
+        current = 0
+        for i, kind, value in _stream_tasklists(creds, jobs, stats, workers, budget):
+            if kind == 'page':
+                if i == current:
+                    count += len(value)
+                    yield from value
+                else:
+                    waiting[i].append(value)
                 continue
+            if kind == 'failed':
+                log.warning("⚠️ Couldn't fetch list '%s': %s", tasklists[i]['title'], value)
+                waiting[i] = []
+            finished[i] = True
+            while current < len(jobs) and finished[current]:
+                current += 1
+                if current < len(jobs):
+                    for page in waiting[current]:
+                        count += len(page)
+                        yield from page
+                    waiting[current] = []
+
+        last_fetch_stats.update(stats)
+        log.info("📦 Fetched %d tasks in %d requests (%.1f KB, %d gzipped)",
+                 count, stats['requests'], stats['bytes'] / 1024, stats['gzipped'])
+
+    except Exception:
+        log.exception("Error fetching tasks from Google")
+
+
+def subscribe(callback):
+    """Call callback(inserted, updated, deleted), three sets of task ids,
+    after every committed write to the tasks table. It runs on whichever
+    thread did the write, so it should only hand the ids off."""
+    _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    _listeners.remove(callback)
+
+
+def subscribe_outbox(callback):
+    """Call callback() after every committed local change that queued
+    something to push (not after pulls). Same threading as subscribe()."""
+    _outbox_listeners.append(callback)
+
+
+def _outbox_changed():
+    for callback in list(_outbox_listeners):
+        callback()
+
 
+def _publish(inserted=(), updated=(), deleted=()):
+    """tell the listeners about a change once the current transaction
+    commits"""
+    inserted, updated, deleted = set(inserted), set(updated), set(deleted)
+    if not (inserted or updated or deleted):
+        return
+
+    def notify():
+        for callback in list(_listeners):
+            callback(inserted, updated, deleted)
+
+    after_commit(DB_FILE, notify)
+
+
+def _task_hash(task):
+    values = (task['title'], task['list_name'], task['due'],
+              task['notes'], task['status'], task.get('position', ''))
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+def upsert_tasks(tasks):
+    """Write a batch of tasks (dicts like get_tasks_online yields) in
+    one transaction. Rows whose content hash matches what is stored
+    are left alone; ones with local changes not pushed yet are merged
+    with them field by field (see _merge_edits).
+
+    returns a dict with the inserted, updated and unchanged counts"""
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    tasks = iter(tasks)
+
+    with transaction(DB_FILE) as cursor:
+        while True:
+            rows = {}
             for task in tasks:
-                task_info = {
-                    'id': task.get('id'),
-                    'title': task.get('title', '[No title]'),
-                    'due': task.get('due', 'No due date'),
-                    'status': task.get('status'),
-                    'notes': task.get('notes', ''),
-                    'list_name': list_name
+                rows[task['id']] = {
+                    'id': task['id'],
+                    'title': task['title'],
+                    'list_name': task['list_name'],
+                    'due_time': task['due'],
+                    'notes': task['notes'],
+                    'status': task['status'],
+                    'position': task.get('position', ''),
+                    'list_id': task.get('list_id'),
+                    'content_hash': _task_hash(task),
+                    'updated': task.get('updated'),
                 }
+                if len(rows) >= UPSERT_CHUNK:
+                    break
+            if not rows:
+                break
+
+            marks = ', '.join('?' * len(rows))
+            stored = {row[0]: row[1:] for row in cursor.execute(
+                f'SELECT id, content_hash, sync_state FROM tasks WHERE id IN ({marks})',
+                list(rows))}
+
+            tombstones = {row[0] for row in cursor.execute(
+                f"SELECT task_id FROM outbox WHERE op = 'delete' AND task_id IN ({marks})",
+                list(rows))}
+
+            # rows deleted here stay deleted until the push goes through,
+            # and ones with local edits waiting to be pushed are merged
+            new_rows = [r for tid, r in rows.items()
+                        if tid not in stored and tid not in tombstones]
+            changed_rows = [r for tid, r in rows.items()
+                            if tid in stored and stored[tid][0] != r['content_hash']]
+            _merge_edits(cursor, [r for r in changed_rows if stored[r['id']][1] != 'synced'])
+
+            cursor.executemany('''
+                INSERT INTO tasks (id, title, list_name, due_time, notes, status,
+                                   position, list_id, content_hash)
+                VALUES (:id, :title, :list_name, :due_time, :notes, :status,
+                        :position, :list_id, :content_hash)
+            ''', new_rows)
+            cursor.executemany('''
+                UPDATE tasks SET title = :title, list_name = :list_name,
+                    due_time = :due_time, notes = :notes, status = :status,
+                    position = :position, list_id = :list_id, content_hash = :content_hash
+                WHERE id = :id
+            ''', changed_rows)
+
+            counts['inserted'] += len(new_rows)
+            counts['updated'] += len(changed_rows)
+            metrics.count('rows_written', len(new_rows) + len(changed_rows))
+            counts['unchanged'] += len(rows) - len(new_rows) - len(changed_rows)
+            _publish(inserted=[r['id'] for r in new_rows],
+                     updated=[r['id'] for r in changed_rows])
+
+    return counts
+
+
+def _parse_time(value):
+    """an RFC 3339 timestamp, Google's or ours, as an aware datetime"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _merge_edits(cursor, rows):
+    """Settle pulled `rows` against the local edits still queued for
+    them, field by field. Every field not edited here takes Google's
+    value, and so does one Google now has the same value for. A field
+    edited here that Google still has as it was before the edit (its
+    base) keeps the local value. Only a field both sides changed is a
+    conflict, and the newer edit wins: ours by its time, Google's by
+    the task's `updated`. Entries queued by older versions don't know
+    their base, and every field in them is settled by the times.
+
+    The rows are changed in place; the outbox is left with just the
+    fields that still need pushing."""
+    if not rows:
+        return
+    by_id = {r['id']: r for r in rows}
+    marks = ', '.join('?' * len(by_id))
+    local = {row[0]: dict(zip((*EDITABLE, 'list_id'), row[1:])) for row in cursor.execute(
+        f"SELECT id, {', '.join(EDITABLE)}, list_id FROM tasks WHERE id IN ({marks})",
+        list(by_id))}
+    queued = cursor.execute(
+        f"SELECT seq, task_id, queued_at, fields FROM outbox "
+        f"WHERE op = 'update' AND task_id IN ({marks})", list(by_id)).fetchall()
+
+    for seq, task_id, queued_at, fields in queued:
+        row = by_id[task_id]
+        fields = json.loads(fields) if fields else dict.fromkeys(EDITABLE, queued_at)
+        remote_at = _parse_time(row['updated']) if row.get('updated') else None
+        keep = {}
+        for column, edit in fields.items():
+            ours, theirs = local[task_id][column], row[column]
+            if theirs == ours:
+                continue  # nothing left to push
+            edited_at = edit[0] if isinstance(edit, list) else edit
+            if isinstance(edit, list) and theirs == edit[1]:
+                keep[column] = edit  # Google hasn't touched it
+            elif remote_at is None or _parse_time(edited_at) >= remote_at:
+                keep[column] = edit
+                log.info("🔀 %s of task %s was changed here and on Google, keeping ours",
+                         column, task_id)
+            else:
+                log.info("🔀 %s of task %s was changed here and on Google, taking Google's",
+                         column, task_id)
+        for column in keep:
+            row[column] = local[task_id][column]
+        if 'list_name' in keep:
+            row['list_id'] = local[task_id]['list_id']
+        if keep == fields:
+            continue
+        if keep:
+            cursor.execute('UPDATE outbox SET fields = ? WHERE seq = ?', (json.dumps(keep), seq))
+        else:
+            cursor.execute('DELETE FROM outbox WHERE seq = ?', (seq,))
+    cursor.executemany('''
+        UPDATE tasks SET sync_state = CASE WHEN EXISTS (
+            SELECT 1 FROM outbox WHERE outbox.task_id = tasks.id)
+            THEN 'dirty' ELSE 'synced' END
+        WHERE id = ?
+    ''', [(task_id,) for task_id in by_id])
+
+
+def _delta_since(state, tasklist):
+    """the updatedMin to pull `tasklist` with, or None for a full resync"""
+    if state is None or state['watermark'] is None or state['synced_at'] is None:
+        return None
+    # tasks carry the list title, so a rename needs every row rewritten
+    if state['title'] != tasklist['title']:
+        return None
+    synced_at = datetime.fromisoformat(state['synced_at'])
+    if datetime.now(timezone.utc) - synced_at > DELTA_MAX_AGE:
+        return None
+    return state['watermark']
+
+
+def _write_pulled(tasks, full, pulled_at, counts):
+    """Write a chunk of pulled tasks, from any of the lists, in one
+    transaction: live ones upserted, deleted ones deleted. The ones
+    from lists being resynced in full (ids in `full`) are stamped
+    with pulled_at, see _finish_tasklist."""
+    live = [t for t in tasks if not t['deleted']]
+    gone = [(t['id'],) for t in tasks if t['deleted']]
+    seen = [t['id'] for t in live if t['list_id'] in full]
+
+    with transaction(DB_FILE) as cursor:
+        for key, value in upsert_tasks(live).items():
+            counts[key] += value
+        cursor.executemany('DELETE FROM tasks WHERE id = ?', gone)
+        counts['deleted'] += cursor.rowcount if gone else 0
+        metrics.count('rows_written', cursor.rowcount if gone else 0)
+        _publish(deleted=[row[0] for row in gone])
+        if seen:
+            cursor.execute(
+                f"UPDATE tasks SET pulled_at = ? WHERE id IN ({', '.join('?' * len(seen))})",
+                [pulled_at, *seen])
+
+
+def _finish_tasklist(tasklist, state, since, watermark, etag, pulled_at, counts):
+    """Once all of a list's pages are written, advance its watermark
+    (so a list that fails part way is pulled from the old one again,
+    and rewriting the pages it did get changes nothing). After a full
+    resync, delete the rows of the list that didn't come back."""
+    # the etag is only any use if the next pull asks the same question
+    tasks_etag = etag if since is not None and watermark == since else None
+
+    with transaction(DB_FILE) as cursor:
+        cursor.execute('''
+            INSERT INTO tasklists (id, title, etag, updated, watermark, synced_at, tasks_etag)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET title = excluded.title,
+                etag = excluded.etag, updated = excluded.updated,
+                watermark = excluded.watermark, synced_at = excluded.synced_at,
+                tasks_etag = excluded.tasks_etag
+        ''', (tasklist['id'], tasklist['title'], tasklist.get('etag'), tasklist.get('updated'),
+              watermark, datetime.now(timezone.utc).isoformat(), tasks_etag))
+
+        if since is None:
+            # anything remote in this list that didn't come back is gone,
+            # unless it was only moved here locally and not pushed yet.
+            # Lists are told apart by id, titles needn't be unique; only
+            # rows that lost theirs go by the title
+            titles = {tasklist['title'], state['title'] if state else tasklist['title']}
+            stale = [
+                (row[0],) for row in cursor.execute(
+                    f"SELECT id FROM tasks WHERE id NOT LIKE 'local-%' "
+                    f"AND (list_id = ? OR list_id IS NULL "
+                    f"     AND list_name IN ({', '.join('?' * len(titles))})) "
+                    f"AND pulled_at IS NOT ? "
+                    f"AND id NOT IN (SELECT task_id FROM outbox)",
+                    [tasklist['id'], *titles, pulled_at])]
+            cursor.executemany('DELETE FROM tasks WHERE id = ?', stale)
+            counts['deleted'] += len(stale)
+            metrics.count('rows_written', len(stale))
+            _publish(deleted=[row[0] for row in stale])
+
+
+def _drop_tasklists(cursor, keep, counts):
+    """Forget every list but the ones with ids in `keep`, and their
+    tasks: Google deleted those along with the list. Tasks with changes
+    still queued here are kept (their list_id goes NULL), so the push
+    can deal with them."""
+    marks = ', '.join('?' * len(keep))
+    gone = [(row[0],) for row in cursor.execute(
+        f"SELECT id FROM tasks WHERE list_id IN "
+        f"(SELECT id FROM tasklists WHERE id NOT IN ({marks})) "
+        f"AND id NOT IN (SELECT task_id FROM outbox)", keep)]
+    cursor.executemany('DELETE FROM tasks WHERE id = ?', gone)
+    counts['deleted'] += len(gone)
+    metrics.count('rows_written', len(gone))
+    _publish(deleted=[row[0] for row in gone])
+    cursor.execute(f"DELETE FROM tasklists WHERE id NOT IN ({marks})", keep)
+
+
+def _get_meta(key):
+    row = get_connection(DB_FILE).execute(
+        'SELECT value FROM sync_meta WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else None
+
+
+@metrics.profile('pull')
+@metrics.timer('pull')
+def pull_from_google(creds, full=False, workers=None, budget=None):
+    """Bring Google's changes into the local db.
+
+    Each list is pulled with updatedMin set to its stored watermark, so
+    only tasks changed since the last pull come back (deletions included).
+    Lists never pulled before, renamed, or not pulled for DELTA_MAX_AGE
+    get a full resync instead, as does everything when `full` is set.
+
+    Requests carry the ETag of the last answer to the same question;
+    a list Google reports unchanged is skipped without parsing or
+    writing anything.
+
+    Pages stream from the fetches to the db as they arrive (see
+    _stream_tasklists) and are committed WRITE_CHUNK tasks at a time,
+    so memory stays flat however many tasks there are. A list's
+    watermark only moves once all of it is written. One that fails
+    (once its retries or the sync's `budget` run out) keeps its old
+    watermark, so the next pull fetches just that list again and the
+    rest of this pull still counts. Cancelling `budget` stops the pull
+    the same way, keeping what was already written.
+
+    returns a dict of inserted/updated/unchanged/deleted/skipped/failed
+    counts, and `requests`: how many requests Google answered, 0 when it
+    couldn't be reached (errors are logged, not raised)"""
+    service = get_service(creds)
+    budget = budget or scheduler.RetryBudget()
+    stats = {'requests': 0, 'bytes': 0, 'gzipped': 0}
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'skipped': 0,
+              'failed': 0}
+    tasklists = []
+    refresh_ids = False
 
-                # print(
-                #     f"  - {task_info['title']} | Due: {task_info['due']} | Status: {task_info['status']}")
-                all_tasks.append(task_info)
-
-        return all_tasks
+    try:
+        cursor = get_connection(DB_FILE).execute(
+            'SELECT id, title, etag, updated, watermark, synced_at, tasks_etag FROM tasklists')
+        states = {row[0]: dict(zip(
+            ('id', 'title', 'etag', 'updated', 'watermark', 'synced_at', 'tasks_etag'), row))
+            for row in cursor.fetchall()}
+
+        with metrics.timer('fetch lists'):
+            pages = list(_list_pages(
+                service.tasklists(), stats, budget=budget,
+                etag=None if full else _get_meta('tasklists_etag'),
+                maxResults=TASKLISTS_PAGE_SIZE, fields=TASKLIST_FIELDS))
+        if pages[0] is NOT_MODIFIED:
+            tasklists = [{'id': s['id'], 'title': s['title'], 'etag': s['etag'],
+                          'updated': s['updated']} for s in states.values()]
+            tasklists_etag = None
+        else:
+            tasklists = [tl for page in pages for tl in page.get('items', [])]
+            tasklists_etag = pages[0].get('etag') if len(pages) == 1 else None
+            # the lists may have been renamed, added or removed
+            refresh_ids = True
 
-    except Exception as e:
-        print("Error fetching tasks from Google:", e)
-        return []
+        jobs = []
+        for tl in tasklists:
+            state = states.get(tl['id'])
+            since = None if full else _delta_since(state, tl)
+            etag = state['tasks_etag'] if state and since is not None else None
+            jobs.append((tl, since, True, etag))
+
+        # new lists need their row before their tasks can point at it;
+        # the rest of it is written once all of the list is in
+        with transaction(DB_FILE) as cursor:
+            cursor.executemany(
+                'INSERT INTO tasklists (id, title) VALUES (?, ?) ON CONFLICT(id) DO NOTHING',
+                [(tl['id'], tl['title']) for tl in tasklists])
+
+        # pages are written WRITE_CHUNK tasks at a time as they stream
+        # in, whichever lists they're from, while the fetches go on
+        pulled_at = datetime.now(timezone.utc).isoformat()
+        full_ids = {tl['id'] for tl, since, _, _ in jobs if since is None}
+        watermarks = [None] * len(jobs)
+        chunk = []
+        for i, kind, value in _stream_tasklists(creds, jobs, stats, workers, budget):
+            tl, since = jobs[i][:2]
+            state = states.get(tl['id'])
+            if kind == 'page':
+                chunk.extend(value)
+                watermarks[i] = max(filter(None, [watermarks[i], *(t['updated'] for t in value)]),
+                                    default=None)
+                if len(chunk) >= WRITE_CHUNK:
+                    with metrics.timer('db upsert'):
+                        _write_pulled(chunk, full_ids, pulled_at, counts)
+                    chunk = []
+            elif kind == 'unchanged':
+                counts['skipped'] += 1
+            elif kind == 'failed':
+                counts['failed'] += 1
+                if not isinstance(value, scheduler.Cancelled):
+                    log.warning("⚠️ Couldn't pull list '%s', it will be retried next sync: %s",
+                                tl['title'], value)
+            else:  # done: its last tasks go in before its watermark moves
+                with metrics.timer('db upsert'):
+                    if chunk:
+                        _write_pulled(chunk, full_ids, pulled_at, counts)
+                        chunk = []
+                    watermark = watermarks[i] or (state['watermark'] if state else None)
+                    _finish_tasklist(tl, state, since, watermark, value, pulled_at, counts)
+        if chunk:  # pages of lists that failed after them, good as far as they go
+            with metrics.timer('db upsert'):
+                _write_pulled(chunk, full_ids, pulled_at, counts)
+
+        if tasklists_etag is not None:
+            with transaction(DB_FILE) as cursor:
+                _drop_tasklists(cursor, [tl['id'] for tl in tasklists], counts)
+                # only once every list is in the table can a 304 next
+                # time be answered from it (a failed new list isn't)
+                if not counts['failed']:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO sync_meta (key, value) "
+                        "VALUES ('tasklists_etag', ?)", (tasklists_etag,))
+
+    except scheduler.Cancelled:
+        log.info("⏹️ Pull cancelled")
+    except Exception:
+        log.exception("Error pulling tasks from Google")
+
+    if refresh_ids:
+        _forget_tasklist_ids()
+
+    counts['requests'] = stats['requests']
+    last_fetch_stats.update(stats)
+    log.info("📦 Pulled %d lists in %d requests (%.1f KB): %s",
+             len(tasklists), stats['requests'], stats['bytes'] / 1024, counts)
+    return counts
 
 
 def insert_task_to_db(task):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        REPLACE INTO tasks (id, title, list_name, due_time, notes, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        task['id'],
-        task['title'],
-        task['list_name'],
-        task['due'],
-        task['notes'],
-        task['status']
-    ))
-
-    conn.commit()
-    conn.close()
-    print(f"✅ Inserted: {task['title']} into DB")
+    upsert_tasks([task])
+    log.debug("✅ Inserted: %s into DB", task['title'])
+
+
+def _enqueue(cursor, task_id, op, list_name=None, list_id=None, fields=None):
+    """Queue `op` ('insert', 'update' or 'delete') on a task for the next
+    push, folded into whatever is already queued for it: insert + update
+    is still an insert, update + update one update, update + delete a
+    delete, and insert + delete nothing at all. The merged entry goes to
+    the back, so a push already in flight can tell it was superseded.
+
+    An update names the `fields` it changed, {column: [edited_at, base]}
+    where base is the value before the edit. They add up with the ones
+    queued before: a field edited again takes the newer time but keeps
+    the first base, what Google had last we knew. When
+    it moves the task, list_name/list_id say where from (the first move
+    queued is the one that counts, that's where Google has the task)."""
+    row = cursor.execute(
+        'SELECT op, list_name, list_id, fields FROM outbox WHERE task_id = ?',
+        (task_id,)).fetchone()
+    queued = row[0] if row else None
+    cursor.execute('DELETE FROM outbox WHERE task_id = ?', (task_id,))
+    after_commit(DB_FILE, _outbox_changed)
+
+    if queued == 'insert':
+        if op == 'delete':
+            return
+        op, fields = 'insert', None
+    elif queued == 'update':
+        if row[2] is not None:  # delete it from where Google still has it
+            list_name, list_id = row[1], row[2]
+        if op == 'update':
+            # no fields queued means every field
+            if row[3] is None or fields is None:
+                fields = None
+            else:
+                queued_fields = json.loads(row[3])
+                for column, (edited_at, base) in fields.items():
+                    if column in queued_fields:
+                        # a bare time is an entry with no base, keep it so
+                        old = queued_fields[column]
+                        fields[column] = [edited_at, old[1]] if isinstance(old, list) else edited_at
+                fields = dict(queued_fields, **fields)
+    if op != 'update':
+        fields = None
+    cursor.execute(
+        'INSERT INTO outbox (task_id, op, list_name, list_id, queued_at, fields) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (task_id, op, list_name, list_id, datetime.now(timezone.utc).isoformat(),
+         None if fields is None else json.dumps(fields)))
 
 
 def add_local_task(title, list_name='Tasks', due_time=None, notes='', status='needsAction'):
     local_id = f'local-{uuid.uuid4().hex[:8]}'
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO tasks (id, title, list_name, due_time, notes, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (local_id, title, list_name, due_time, notes, status))
+    list_id = _get_tasklist_ids().get(list_name)
 
-    conn.commit()
-    conn.close()
-    print(f"📝 Saved locally: {title}")
+    with transaction(DB_FILE) as cursor:
+        cursor.execute('''
+            INSERT INTO tasks (id, title, list_name, due_time, notes, status, list_id, sync_state)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'local')
+        ''', (local_id, title, list_name, due_time, notes, status, list_id))
+        _enqueue(cursor, local_id, 'insert')
+        _publish(inserted=[local_id])
+    metrics.count('rows_written')
+    log.debug("📝 Saved locally: %s", title)
 
 
 def delete_local_task(task_id):
     """permanently delete a task from the database"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-    conn.commit()
-    conn.close()
-    print(f"🗑️ Deleted task with ID: {task_id}")
+    with transaction(DB_FILE) as cursor:
+        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        _publish(deleted=[task_id])
+    metrics.count('rows_written')
+    log.debug("🗑️ Deleted task with ID: %s", task_id)
 
 
 def delete_syncable_task(task_id):
     """Mark a task as deleted, so that
     when we are syncing, we perform this action
     in the API to remove this task if it is in
-    the account but deleted here, in the local db"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
+    the account but deleted here, in the local db
+
+    The row goes now; the outbox keeps a tombstone (id and list) for
+    the push to delete on Google."""
+    with transaction(DB_FILE) as cursor:
+        row = cursor.execute(
+            'SELECT list_name, list_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if row is None:
+            return
+        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        _enqueue(cursor, task_id, 'delete', *row)
+        _publish(deleted=[task_id])
+    metrics.count('rows_written')
+    log.debug("🗑️ Deleted task with ID: %s (queued for Google)", task_id)
+
+
+# The readers go to SQLite every time, there's no copy of the tasks
+# table in memory. Over this thread's open connection a lookup by id
+# is a few microseconds, and the list reads one page at a time along
+# its sort order's index (query_tasks), which a dict of the whole table
+# couldn't serve without sorting it; keeping one cost a load of every
+# row and an invalidation on every commit for reads nothing made.
 
 def get_all_local_tasks():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks')
-    tasks = cursor.fetchall()
-    conn.close()
-    return tasks
+    """every task as a TaskSummary, in the order they were added"""
+    cursor = get_connection(DB_FILE).execute(
+        f'SELECT {SUMMARY_COLUMNS} FROM tasks ORDER BY seq')
+    return list(map(TaskSummary._make, cursor))
 
 
 def get_task_by_id(task_id):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-    task = cursor.fetchone()
-    conn.close()
-    return task
+    """the whole Task, notes included, read from the db; None if gone"""
+    row = get_connection(DB_FILE).execute(
+        f'SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?', (task_id,)).fetchone()
+    return Task._make(row) if row else None
 
 
-def update_local_task(task_id, title=None, list_name=None, due_time=None, notes=None, status=None):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def count_tasks():
+    return get_connection(DB_FILE).execute('SELECT count(*) FROM tasks').fetchone()[0]
+
+
+def query_tasks(order='position', after=None, limit=PAGE_SIZE):
+    """One page of TaskSummaries sorted by `order` (a key of ORDERS),
+    starting after the row whose sort key is `after`, or at the top.
 
-    updates = []
+    returns (tasks, key): pass `key` as `after` for the next page; it is
+    None once there are no more. Each page is a seek into the order's
+    index, so page 1000 costs what page 1 does, where OFFSET would step
+    over every row before it."""
+    rows = query_keyed_tasks(order, after, limit)
+    return [task for task, _ in rows], (rows[-1][1] if len(rows) == limit else None)
+
+
+def query_keyed_tasks(order='position', after=None, limit=PAGE_SIZE):
+    """query_tasks' page as (TaskSummary, its sort key) pairs"""
+    key = ORDERS[order]
+    columns = ', '.join(key)
+    where = ''
     params = []
+    if after is not None:
+        where = f"WHERE ({columns}) > ({', '.join('?' * len(key))})"
+        params.extend(after)
+    cursor = get_connection(DB_FILE).execute(
+        f'SELECT {SUMMARY_COLUMNS}, {columns} FROM tasks {where} '
+        f'ORDER BY {columns} LIMIT ?', params + [limit])
+    return [_keyed(row) for row in cursor]
+
+
+def get_keyed_tasks(task_ids, order='position'):
+    """{id: (TaskSummary, its sort key in `order`)} for the `task_ids`
+    that exist; for patching rows already on screen"""
+    task_ids = list(task_ids)
+    columns = ', '.join(ORDERS[order])
+    conn = get_connection(DB_FILE)
+    tasks = {}
+    for start in range(0, len(task_ids), UPSERT_CHUNK):
+        chunk = task_ids[start:start + UPSERT_CHUNK]
+        for row in conn.execute(
+                f"SELECT {SUMMARY_COLUMNS}, {columns} FROM tasks "
+                f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+            task, key = _keyed(row)
+            tasks[task.id] = (task, key)
+    return tasks
 
-    if title is not None:
-        updates.append("title = ?")
-        params.append(title)
-    if list_name is not None:
-        updates.append("list_name = ?")
-        params.append(list_name)
-    if due_time is not None:
-        updates.append("due_time = ?")
-        params.append(due_time)
-    if notes is not None:
-        updates.append("notes = ?")
-        params.append(notes)
-    if status is not None:
-        updates.append("status = ?")
-        params.append(status)
-
-    if updates:
-        query = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ?"
-        params.append(task_id)
-        cursor.execute(query, tuple(params))
-        conn.commit()
-        print(f"🔄 Updated task with ID: {task_id}")
-
-    conn.close()
 
+def _keyed(row):
+    width = len(TaskSummary._fields)
+    return TaskSummary._make(row[:width]), tuple(row[width:])
 
-def update_google_tasks_from_local(creds):
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+def skip_tasks(order='position', after=None, count=PAGE_SIZE):
+    """the sort key of the row `count` rows on from `after` (None for
+    the top), or None if there aren't that many; for jumping ahead
+    without loading the rows in between. The OFFSET here only steps
+    over entries of the order's index, and paging never uses it."""
+    key = ORDERS[order]
+    columns = ', '.join(key)
+    where = ''
+    params = []
+    if after is not None:
+        where = f"WHERE ({columns}) > ({', '.join('?' * len(key))})"
+        params.extend(after)
+    row = get_connection(DB_FILE).execute(
+        f'SELECT {columns} FROM tasks {where} ORDER BY {columns} LIMIT 1 OFFSET ?',
+        params + [count - 1]).fetchone()
+    return tuple(row) if row else None
+
+
+def search_tasks(query, limit=50, offset=0):
+    """Tasks whose title or notes contain every word of `query`, each
+    word as a prefix ("gro mil" finds "Groceries: milk").
+
+    Tasks matching on the title come before tasks that only match in
+    their notes, newest first within each (by seq, the tasks' rowid).
+    FTS5 hands rows back in rowid order straight from the index, so a page costs the same
+    whether a word is in ten tasks or ten thousand; bm25() has to score
+    every hit before it can sort and took >100ms on common words."""
+    words = re.findall(r'\w+', query)
+    if not words:
+        return []
+    terms = ' '.join(f'"{word}"*' for word in words)
+    tiers = (f'title : ({terms})', f'({terms}) NOT title : ({terms})')
+
+    conn = get_connection(DB_FILE)
+    rowids = []
+    for match in tiers:
+        # ask the first tier for offset + limit rows so that if it runs
+        # short we know exactly how far into the second one to skip
+        want = offset + limit - len(rowids)
+        hits = [row[0] for row in conn.execute(
+            'SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ? '
+            'ORDER BY rowid DESC LIMIT ?', (match, want))]
+        rowids += hits
+        if len(hits) == want:
+            break
+    rowids = rowids[offset:]
+    if not rowids:
+        return []
 
-    cursor.execute(
-        "SELECT * FROM tasks WHERE id NOT LIKE 'local-%' AND status = 'completed'")
-    completed_tasks = cursor.fetchall()
+    marks = ','.join('?' * len(rowids))
+    cursor = conn.execute(
+        f'SELECT seq, {SUMMARY_COLUMNS} FROM tasks WHERE seq IN ({marks})', rowids)
+    rows = {row[0]: TaskSummary._make(row[1:]) for row in cursor}
+    return [rows[rowid] for rowid in rowids if rowid in rows]
 
-    if not completed_tasks:
-        print("✅ No completed tasks to update online.")
-        conn.close()
-        return
 
-    service = build('tasks', 'v1', credentials=creds)
-    tasklists = service.tasklists().list().execute().get('items', [])
-    tasklist_map = {tl['title']: tl['id'] for tl in tasklists}
+def update_local_task(task_id, title=None, list_name=None, due_time=None, notes=None, status=None):
+    """Edit a task in place. Only the fields that really change are
+    written and queued, so the push patches just those on Google.
+
+    content_hash is left as the hash of Google's copy on purpose: a pull
+    bringing that same copy back is skipped and the edit waits for the
+    push, while one Google changed since goes through _merge_edits. The
+    push re-hashes the row from Google's answer once it lands."""
+    edits = {'title': title, 'list_name': list_name, 'due_time': due_time,
+             'notes': notes, 'status': status}
+    with transaction(DB_FILE) as cursor:
+        row = cursor.execute(
+            f"SELECT {', '.join(EDITABLE)}, list_id FROM tasks WHERE id = ?",
+            (task_id,)).fetchone()
+        if row is None:
+            return
+        stored = dict(zip(EDITABLE, row))
+        changes = {column: value for column, value in edits.items()
+                   if value is not None and value != stored[column]}
+        if not changes:
+            return
+
+        moved_from = (None, None)
+        if 'list_name' in changes:
+            changes['list_id'] = _get_tasklist_ids().get(list_name)
+            moved_from = (stored['list_name'], row[-1])
+        now = datetime.now(timezone.utc).isoformat()
+        fields = {column: [now, stored[column]] for column in changes if column in EDITABLE}
+        cursor.execute(
+            f"UPDATE tasks SET {', '.join(f'{column} = ?' for column in changes)}, "
+            "sync_state = CASE sync_state WHEN 'synced' THEN 'dirty' ELSE sync_state END "
+            "WHERE id = ?", (*changes.values(), task_id))
+        _enqueue(cursor, task_id, 'update', *moved_from, fields=fields)
+        _publish(updated=[task_id])
+    metrics.count('rows_written')
+    log.debug("🔄 Updated %s of task with ID: %s", ', '.join(fields), task_id)
+
+
+def _run_batch(service, requests, on_success, budget=None):
+    """Send `requests` ({key: HttpRequest}) through the batch endpoint,
+    BATCH_SIZE per HTTP call, paced by the scheduler's token bucket.
+    on_success(key, response) runs for every sub-request that worked;
+    only the ones that failed with a retryable error are sent again,
+    after a backoff and as far as `budget` allows. One whose on_success
+    raised counts as failed too, but isn't sent again: Google has done
+    it, it's the local side that needs another go.
+
+    returns {key: exception} for the sub-requests that never succeeded"""
+    pending = dict(requests)
+    failed = {}
+    unrecorded = set()  # worked on Google, but on_success raised
+
+    for attempt in range(scheduler.MAX_ATTEMPTS):
+        keys = list(pending)
+        for start in range(0, len(keys), BATCH_SIZE):
+            chunk = keys[start:start + BATCH_SIZE]
+            answered = set()
+
+            def callback(key, response, exception):
+                answered.add(key)
+                if exception is not None:
+                    failed[key] = exception
+                    return
+                try:
+                    on_success(key, response)
+                except Exception as e:
+                    log.exception("Couldn't record what Google did for %s", key)
+                    failed[key] = e
+                    unrecorded.add(key)
+                else:
+                    failed.pop(key, None)
+
+            batch = service.new_batch_http_request(callback=callback)
+            for key in chunk:
+                batch.add(pending[key], request_id=key)
+            # each sub-request counts against the quota
+            scheduler.limiter.acquire(len(chunk))
+            scheduler.check(budget)  # what's been sent so far is kept
+            metrics.count('api_calls', len(chunk))
+            metrics.count('batch_requests')
+            try:
+                batch.execute()
+            except Exception as e:  # the whole HTTP call failed
+                for key in chunk:
+                    if key not in answered:
+                        failed[key] = e
+
+        retry = [key for key in pending if key in failed and key not in unrecorded
+                 and scheduler.is_retryable(failed[key])]
+        if attempt + 1 < scheduler.MAX_ATTEMPTS and retry and budget is not None:
+            retry = retry[:budget.spend(len(retry))]
+        if not retry or attempt + 1 == scheduler.MAX_ATTEMPTS:
+            break
+        scheduler.wait_before_retry(attempt, [failed[key] for key in retry])
+        pending = {key: pending[key] for key in retry}
+
+    return failed
 
-    for task in completed_tasks:
-        task_id, title, list_name, due, notes, status = task
 
-        # Skip invalid or local tasks
-        if not task_id or task_id.startswith('local-'):
-            print(f"⚠️ Skipping invalid task ID: {task_id}")
-            continue
+def update_google_tasks_from_local(creds):
+    """completions are queued in the outbox like every other local
+    change, so this is the same push"""
+    push_local_tasks_to_google(creds)
+
+
+@metrics.profile('push')
+@metrics.timer('push')
+def push_local_tasks_to_google(creds, budget=None):
+    """Drain the outbox: send the local changes queued since the last
+    push (new tasks, edits, deletions) to Google in batches. The work
+    is one request per changed task, however big the account is, and
+    an edit only patches the fields that changed (plus a move first if
+    it changed list). Whatever fails stays queued for the next push.
+
+    raises scheduler.Cancelled if `budget` is cancelled part way; the
+    changes pushed by then are kept"""
+    conn = get_connection(DB_FILE)
+    entries = conn.execute(
+        'SELECT seq, task_id, op, list_name, list_id, fields FROM outbox ORDER BY seq'
+    ).fetchall()
+
+    if not entries:
+        log.info("✅ No local changes to push.")
+        return
 
-        list_id = tasklist_map.get(list_name)
-        if not list_id:
-            print(
-                f"⚠️ List not found for '{title}' (list_name='{list_name}'), skipping...")
+    service = get_service(creds)
+    budget = budget or scheduler.RetryBudget()
+    tasklist_map = _get_tasklist_ids()
+    if not tasklist_map:
+        # never pulled, so learn the lists once
+        stats = {'requests': 0, 'bytes': 0, 'gzipped': 0}
+        tasklists = list(_list_all(service.tasklists(), stats, budget=budget,
+                                   maxResults=TASKLISTS_PAGE_SIZE, fields=TASKLIST_FIELDS))
+        with transaction(DB_FILE) as cursor:
+            cursor.executemany(
+                'INSERT INTO tasklists (id, title, etag, updated) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(id) DO NOTHING',
+                [(tl['id'], tl['title'], tl.get('etag'), tl.get('updated')) for tl in tasklists])
+        _forget_tasklist_ids()
+        tasklist_map = _get_tasklist_ids()
+
+    jobs = {}
+    moves = {}
+    requests = {}
+    unchanged = []
+    stays_in = {}  # task id -> the list Google has it in, for moves that can't happen
+    for seq, task_id, op, list_name, list_id, fields in entries:
+        if op == 'delete':
+            list_id = list_id or tasklist_map.get(list_name)
+            if not list_id:
+                log.warning("⚠️ List not found for deleted task %s, skipping...", task_id)
+                continue
+            jobs[task_id] = (seq, op, task_id, list_name, list_id)
+            requests[task_id] = service.tasks().delete(tasklist=list_id, task=task_id)
             continue
 
-        try:
-            service.tasks().update(
-                tasklist=list_id,
-                task=task_id,
-                body={'status': 'completed'}
-            ).execute()
-            print(f"☑️ Updated on Google: {title}")
-        except Exception as e:
-            print(f"❌ Failed to update task '{title}' – {e}")
-
-    conn.close()
+        row = conn.execute(
+            f'SELECT {TASK_COLUMNS}, list_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        if row is None:
+            continue
+        task = Task._make(row[:-1])
+        moved_from, list_id = list_id, row[-1] or tasklist_map.get(task.list_name)
+        jobs[task_id] = (seq, op, task.title, task.list_name, list_id)
 
+        if op == 'insert':
+            requests[task_id] = service.tasks().insert(
+                tasklist=list_id or '@default', body=_task_body(task))
+            continue
+        if not list_id:
+            # moved to a list Google doesn't have: the rest of the edit
+            # still goes, and the task stays in the list it's in there
+            list_id = moved_from or '@default'
+            stays_in[task_id] = next(
+                (title for title, id_ in tasklist_map.items() if id_ == moved_from), None)
+            log.warning("⚠️ No list '%s' on Google, '%s' stays in %s", task.list_name,
+                        task.title, stays_in[task_id] or 'the default list')
+            jobs[task_id] = (seq, op, task.title, stays_in[task_id] or task.list_name, list_id)
+        fields = None if fields is None else json.loads(fields)
+        if moved_from and moved_from != list_id and (fields is None or 'list_name' in fields):
+            moves[task_id] = service.tasks().move(
+                tasklist=moved_from, task=task_id, destinationTasklist=list_id)
+        body = _task_body(task, fields)
+        if body:
+            requests[task_id] = service.tasks().patch(
+                tasklist=list_id, task=task_id, body=body)
+        elif task_id not in moves:  # e.g. moved back where it was
+            unchanged.append(task_id)
+
+    def pushed(task_id, response):
+        seq, op, title, list_name, list_id = jobs[task_id]
+        with transaction(DB_FILE) as cursor:
+            # a change made while this was in flight has a newer seq and stays queued
+            cursor.execute('DELETE FROM outbox WHERE seq = ?', (seq,))
+            if op == 'update' and not cursor.rowcount and response is not None:
+                # Google has what was just pushed now, that's the base of
+                # the fields edited again meanwhile
+                remote = _normalize(response, {'id': list_id, 'title': list_name})
+                row = cursor.execute(
+                    'SELECT seq, fields FROM outbox WHERE task_id = ?', (task_id,)).fetchone()
+                if row is not None and row[1]:
+                    fields = json.loads(row[1])
+                    for column, edit in fields.items():
+                        if isinstance(edit, list):
+                            edit[1] = remote['due' if column == 'due_time' else column]
+                    cursor.execute('UPDATE outbox SET fields = ? WHERE seq = ?',
+                                   (json.dumps(fields), row[0]))
+            if op == 'insert':
+                # Safely swap in the remote id only now the insert succeeded
+                new_id = response['id']
+                cursor.execute('UPDATE tasks SET id = ? WHERE id = ?', (new_id, task_id))
+                if cursor.rowcount:
+                    cursor.execute(
+                        "UPDATE outbox SET task_id = ?, op = 'update' WHERE task_id = ?",
+                        (new_id, task_id))
+                    _publish(inserted=[new_id], deleted=[task_id])
+                else:  # deleted here while it was being pushed
+                    cursor.execute('DELETE FROM outbox WHERE task_id = ?', (task_id,))
+                    _enqueue(cursor, new_id, 'delete', list_name)
+                task_id = new_id
+            if stays_in.get(task_id):
+                cursor.execute('''
+                    UPDATE tasks SET list_name = ?, list_id = ? WHERE id = ?
+                    AND NOT EXISTS (SELECT 1 FROM outbox WHERE outbox.task_id = tasks.id)
+                ''', (stays_in[task_id], list_id, task_id))
+            if op != 'delete':
+                if response is not None:
+                    # hash what Google has now, so pulling it back is a no-op
+                    remote = _normalize(response, {'id': list_id, 'title': list_name})
+                    cursor.execute(
+                        'UPDATE tasks SET position = ?, content_hash = ? WHERE id = ?',
+                        (remote['position'], _task_hash(remote), task_id))
+                    _publish(updated=[task_id])
+                cursor.execute('''
+                    UPDATE tasks SET sync_state = CASE WHEN EXISTS (
+                        SELECT 1 FROM outbox WHERE outbox.task_id = tasks.id)
+                        THEN 'dirty' ELSE 'synced' END
+                    WHERE id = ?
+                ''', (task_id,))
+        log.debug("☁️ Pushed (%s): %s → Google", op, title)
+
+    def moved(task_id, response):
+        if task_id not in requests:
+            pushed(task_id, response)
+            return
+        # it's in its new list now, whatever happens to the patch
+        with transaction(DB_FILE) as cursor:
+            cursor.execute('UPDATE outbox SET list_id = NULL WHERE seq = ?', (jobs[task_id][0],))
+
+    for task_id in unchanged:
+        pushed(task_id, None)
+    # a task is moved before it's patched in its new list
+    failed = _run_batch(service, moves, moved, budget)
+    for task_id in failed:
+        requests.pop(task_id, None)
+    failed.update(_run_batch(service, requests, pushed, budget))
+
+    for task_id, e in failed.items():
+        seq, op, title, list_name, list_id = jobs[task_id]
+        status = getattr(getattr(e, 'resp', None), 'status', None)
+        if op == 'delete' and status in (404, 410):  # already gone there
+            with transaction(DB_FILE) as cursor:
+                cursor.execute('DELETE FROM outbox WHERE seq = ?', (seq,))
+            continue
+        if op == 'update' and status in (404, 410):
+            # gone from Google (its list was deleted, say), so the edited
+            # task goes back as a new one
+            with transaction(DB_FILE) as cursor:
+                if cursor.execute('DELETE FROM outbox WHERE seq = ?', (seq,)).rowcount:
+                    _enqueue(cursor, task_id, 'insert')
+            log.warning("⚠️ '%s' is gone from Google, it will be added again", title)
+            continue
+        log.error("❌ Failed to push (%s) '%s' — %s", op, title, e)
 
-def push_local_tasks_to_google(creds):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks WHERE id LIKE 'local-%'")
-    local_tasks = cursor.fetchall()
+    log.info("🚀 Done pushing %d local changes.", len(jobs))
 
-    if not local_tasks:
-        print("✅ No local tasks to push.")
-        conn.close()
-        return
 
-    service = build('tasks', 'v1', credentials=creds)
-    tasklists = service.tasklists().list().execute().get('items', [])
-    tasklist_map = {tl['title']: tl['id'] for tl in tasklists}
-    default_list_id = tasklists[0]['id'] if tasklists else None
-
-    for task in local_tasks:
-        local_id, title, list_name, due_time, notes, status = task
-
-        task_body = {
-            'title': title,
-            'notes': notes,
-            'status': status
-        }
-        if due_time:
-            task_body['due'] = due_time
-
-        list_id = tasklist_map.get(list_name, default_list_id)
-
-        try:
-            new_task = service.tasks().insert(tasklist=list_id, body=task_body).execute()
-
-            # Safely replace the local task only if insert succeeded
-            cursor.execute("BEGIN")
-            cursor.execute("DELETE FROM tasks WHERE id = ?", (local_id,))
-            cursor.execute('''
-                INSERT INTO tasks (id, title, list_name, due_time, notes, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (
-                new_task['id'],
-                new_task['title'],
-                list_name,
-                new_task.get('due'),
-                new_task.get('notes'),
-                new_task['status']
-            ))
-            conn.commit()
-            print(f"☁️ Pushed: {title} → Google")
-
-        except Exception as e:
-            conn.rollback()
-            print(f"❌ Failed to push '{title}' — {e}")
-
-    conn.close()
-    print("🚀 Done pushing all local tasks.")
+def _task_body(task, fields=None):
+    """the API body for a Task: every field, or for a patch just the
+    `fields` (columns) edited here. A blank due date clears it."""
+    body = {field: getattr(task, column) for column, field in PATCH_FIELDS.items()
+            if fields is None or column in fields}
+    if body.get('due') in ('', 'No due date'):
+        body['due'] = None
+    return body
 
 
 def mark_task_as_completed(task_id, creds):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-    task = cursor.fetchone()
+    task = get_connection(DB_FILE).execute(
+        f'SELECT {TASK_COLUMNS}, list_id FROM tasks WHERE id = ?', (task_id,)).fetchone()
 
     if not task_id or task_id.startswith('local-'):
-        print(f"⚠️ Skipping invalid task ID: {task_id}")
-        conn.close()
+        log.warning("⚠️ Skipping invalid task ID: %s", task_id)
         return  # ✅ <-- this line was missing
 
-    service = build('tasks', 'v1', credentials=creds)
+    from googleapiclient.errors import HttpError
+
+    service = get_service(creds)
     try:
-        service.tasks().update(
-            tasklist=task[2],  # list_name
+        scheduler.call(service.tasks().patch(
+            tasklist=task[6] or _get_tasklist_ids().get(task[2]),
             task=task_id,
             body={'status': 'completed'}
-        ).execute()
-        cursor.execute('UPDATE tasks SET status = ? WHERE id = ?',
-                       ('completed', task_id))
-        conn.commit()
-        print(f"✅ Marked task '{task[1]}' as completed.")
+        ).execute)
+        with transaction(DB_FILE) as cursor:
+            cursor.execute("UPDATE tasks SET status = ?, sync_state = 'synced' WHERE id = ?",
+                           ('completed', task_id))
+            _publish(updated=[task_id])
+        log.info("✅ Marked task '%s' as completed.", task[1])
     except HttpError as e:
-        print(f"❌ Error marking task as completed: {e}")
-
-    conn.close()
+        log.error("❌ Error marking task as completed: %s", e)
 
 
 if __name__ == "__main__":
     # run when connected to the internet
+    metrics.setup_logging()
     creds = get_google_credentials()
     initialize_database()
-    all_tasks = get_tasks_online(creds)
-
-    for task in all_tasks:
-        insert_task_to_db(task)
-    print("✅ All tasks fetched and stored locally.")
+    counts = pull_from_google(creds, full=True)
+    log.info("✅ All tasks fetched and stored locally: %s", counts)
 
     add_local_task("Sample Task", "Personal",
                    "2023-12-31T23:59:59Z", "This is a sample task.")
-    print("📝 Added a sample local task.")
+    log.info("📝 Added a sample local task.")
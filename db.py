@@ -0,0 +1,116 @@
+"""Shared SQLite connections for core.py.
+
+Opening a fresh connection for every read or write means a new file
+handle, a schema parse and an fsync each time. Instead every thread keeps
+one long-lived connection per database file, set up once with WAL
+journaling so the Tk thread can keep reading while the sync thread writes.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+BUSY_TIMEOUT = 10.0  # seconds to wait on a competing writer
+CACHED_STATEMENTS = 256  # prepared statements kept per connection
+CACHE_SIZE_KB = 16 * 1024
+MMAP_SIZE = 128 * 1024 * 1024
+
+_local = threading.local()
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=CACHED_STATEMENTS,
+        isolation_level=None,  # we issue BEGIN/COMMIT ourselves
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+def get_connection(path):
+    """Return this thread's connection to `path`, opening it on first use."""
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _open(path)
+    return conn
+
+
+@contextmanager
+def transaction(path):
+    """Run a block of writes as one transaction and yield a cursor.
+
+    BEGIN IMMEDIATE takes the write lock up front, so two writers queue on
+    the busy timeout instead of failing halfway with "database is locked".
+    Nested use joins the outer transaction.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn.cursor()
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        _pending(path).clear()
+        raise
+    conn.commit()
+
+    callbacks = _pending(path)
+    while callbacks:
+        callbacks.pop(0)()
+
+
+def _pending(path):
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        pending = _local.pending = {}
+    return pending.setdefault(path, [])
+
+
+def after_commit(path, callback):
+    """Call `callback()` once this thread's open transaction on `path`
+    commits (it is dropped on rollback), or right away if none is open."""
+    if get_connection(path).in_transaction:
+        _pending(path).append(callback)
+    else:
+        callback()
+
+
+def migrate(path, migrations):
+    """Bring the database at `path` up to schema version len(migrations).
+
+    The version lives in PRAGMA user_version. migrations[i](cursor)
+    upgrades a version i database to i + 1; each step commits together
+    with its version bump, so an interrupted upgrade resumes where it
+    stopped. Returns the version the database was at before."""
+    start = None
+    while True:
+        with transaction(path) as cursor:
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            if start is None:
+                start = version
+            if version >= len(migrations):
+                return start
+            migrations[version](cursor)
+            cursor.execute(f'PRAGMA user_version = {version + 1}')
+
+
+def close_connection(path=None):
+    """Close this thread's connection(s); the next call reopens them."""
+    conns = getattr(_local, 'conns', {})
+    paths = [path] if path is not None else list(conns)
+    for p in paths:
+        conn = conns.pop(p, None)
+        if conn is not None:
+            conn.close()
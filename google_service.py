@@ -0,0 +1,65 @@
+"""One Google Tasks client per thread, built once and kept alive.
+
+build() parses the discovery document and makes a new HTTP client every
+time it is called, so every sync paid for a fresh TLS handshake on each
+function. Here the client is built from the discovery document bundled
+with googleapiclient (no fetch at startup) on top of an httplib2 client
+that keeps its connections open between calls. httplib2 isn't thread
+safe, so each thread gets its own client and connection pool.
+"""
+import threading
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build
+
+
+HTTP_TIMEOUT = 30  # seconds
+
+_local = threading.local()
+_http_factory = None
+_stats_lock = threading.Lock()
+_stats = {'opened': 0, 'reused': 0}
+
+
+class _CountingHttp(httplib2.Http):
+    """httplib2.Http that counts how often it had to open a connection
+    versus reusing one left open by an earlier request"""
+
+    def _conn_request(self, conn, request_uri, method, body, headers):
+        with _stats_lock:
+            _stats['opened' if conn.sock is None else 'reused'] += 1
+        return super()._conn_request(conn, request_uri, method, body, headers)
+
+
+def set_http_factory(factory):
+    """Send requests through factory() instead of a real connection;
+    factory returns an httplib2.Http lookalike, one per thread. The load
+    tests use it to talk to benchmarks/fakeserver.py. None goes back to
+    the network."""
+    global _http_factory
+    _http_factory = factory
+
+
+def get_service(creds):
+    """Return this thread's Tasks client for `creds`, building it on first use."""
+    cached = getattr(_local, 'service', None)
+    if cached is not None and cached[0] is creds and cached[1] is _http_factory:
+        return cached[2]
+
+    transport = (_http_factory or _default_http)()
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=transport)
+    service = build('tasks', 'v1', http=http,
+                    static_discovery=True, cache_discovery=False)
+    _local.service = (creds, _http_factory, service)
+    return service
+
+
+def _default_http():
+    return _CountingHttp(timeout=HTTP_TIMEOUT)
+
+
+def connection_stats():
+    """how many connections were opened and how many requests reused one"""
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,111 @@
+"""Timings, counters and logging for core.py and the GUI.
+
+Code times its phases with `with timer('fetch tasks'):` and counts what
+it spends with count('api_calls') / count('bytes', n). Both are cheap
+enough for the sync paths (a lock and a dict update), but are meant per
+phase or per request, not per row. snapshot() returns everything since
+the last reset() and dump() writes it as JSON, which the GUI does after
+every sync when BMA_METRICS names a file.
+
+Logging replaces the print() calls: per-task messages are DEBUG, sync
+summaries INFO. setup_logging() takes the level from BMA_LOG_LEVEL.
+
+With BMA_PROFILE set to a directory, every `with profile('pull'):`
+block runs under cProfile and leaves a .prof file there. cProfile only
+sees the thread that entered the block; time the fetch workers spend
+shows up there as waiting on their results.
+"""
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+LOG_FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+METRICS_FILE = os.environ.get('BMA_METRICS')
+PROFILE_DIR = os.environ.get('BMA_PROFILE')
+
+_lock = threading.Lock()
+_timers = {}  # phase -> [calls, total seconds, longest]
+_counters = Counter()
+_started = time.time()
+
+
+def setup_logging(level=None):
+    """log to stderr at `level`, or BMA_LOG_LEVEL, or INFO"""
+    level = level or os.environ.get('BMA_LOG_LEVEL', 'INFO')
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level,
+                        format=LOG_FORMAT)
+
+
+@contextmanager
+def timer(phase):
+    """add the time spent in the block to `phase`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            entry = _timers.setdefault(phase, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+
+def count(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def snapshot():
+    """the timers and counters since the last reset(), as plain dicts"""
+    with _lock:
+        return {
+            'started': _started,
+            'seconds': time.time() - _started,
+            'timers': {phase: {'calls': calls, 'seconds': total, 'longest': longest}
+                       for phase, (calls, total, longest) in _timers.items()},
+            'counters': dict(_counters),
+        }
+
+
+def reset():
+    global _started
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _started = time.time()
+
+
+def dump(path=None):
+    """write snapshot() as JSON to `path` (default BMA_METRICS) and
+    return it; nothing is written when there is nowhere to write to"""
+    data = snapshot()
+    path = path or METRICS_FILE
+    if path:
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+    return data
+
+
+@contextmanager
+def profile(name):
+    """run the block under cProfile when BMA_PROFILE is set, saving
+    <name>-<time>.prof in that directory (open it with pstats or snakeviz)"""
+    if not PROFILE_DIR:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(
+            PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof"))
@@ -0,0 +1,182 @@
+"""Pacing and retrying for the requests core.py sends to Google.
+
+Every API call waits its turn at one token bucket shared by all threads,
+so a sync never goes over RATE requests a second (BURST back to back);
+the sub-requests of a batch count one each, as they do against Google's
+quota. A 429 pauses the bucket for everyone, not just the thread that
+got it.
+
+Failures worth retrying (429s, 5xx, 403s over quota, dropped
+connections) are retried with jittered exponential backoff, waiting at
+least as long as Google's Retry-After asks. Each sync carries a
+RetryBudget; once it is spent errors are raised straight away, so a sync
+under quota pressure gives up on what's left instead of hammering the
+API, and the next sync picks up from there. Cancelling the budget
+stops the sync at its next API call.
+"""
+import json
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import metrics
+
+RATE = 20.0  # requests per second, on average
+BURST = 100  # two full batches back to back
+BACKOFF_BASE = 0.5  # seconds before the first retry, doubling after
+BACKOFF_CAP = 32.0
+MAX_ATTEMPTS = 5  # tries per request, the first one included
+SYNC_RETRIES = 50  # retries a RetryBudget allows by default
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# the reasons a 403 carries when it's really Google's quota talking
+QUOTA_REASONS = frozenset({
+    'rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded',
+    'dailyLimitExceeded', 'RATE_LIMIT_EXCEEDED', 'RESOURCE_EXHAUSTED',
+})
+
+
+class TokenBucket:
+    """`rate` tokens a second, holding at most `burst`. Callers may take
+    more than are there; they sleep off the debt, and so queue up in the
+    order they came."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, n=1):
+        """take `n` tokens, sleeping until they are paid for; returns
+        the seconds slept"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= n
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+        if wait:
+            metrics.count('throttled_seconds', wait)
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """hold every caller back for `seconds`"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class Cancelled(Exception):
+    """raised instead of making a call for a sync that was cancelled"""
+
+
+class RetryBudget:
+    """how many retries one sync may still make, across all its threads"""
+
+    def __init__(self, retries=SYNC_RETRIES):
+        self.left = retries
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """stop the sync: its calls from now on raise Cancelled"""
+        with self._lock:
+            self.cancelled = True
+            self.left = 0
+
+    def spend(self, n=1):
+        """take up to `n` retries; returns how many were granted"""
+        with self._lock:
+            granted = min(n, self.left)
+            self.left -= granted
+            return granted
+
+
+limiter = TokenBucket(RATE, BURST)
+
+
+def status_of(error):
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+def reasons_of(error):
+    """the machine-readable reasons in an HttpError's body, e.g. {'quotaExceeded'}"""
+    details = getattr(error, 'error_details', None)
+    if not isinstance(details, list):
+        try:
+            body = json.loads(error.content)['error']
+            details = body.get('errors') or body.get('details') or []
+        except (AttributeError, TypeError, ValueError, KeyError):
+            return set()
+    # v1 bodies list {'reason': ...} errors, google.rpc ones ErrorInfo details
+    return {d['reason'] for d in details if isinstance(d, dict) and d.get('reason')}
+
+
+def is_throttled(error):
+    status = status_of(error)
+    # quota errors also come back as 403s, told apart only by their reason
+    return status == 429 or (status == 403 and not QUOTA_REASONS.isdisjoint(reasons_of(error)))
+
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return status_of(error) in RETRYABLE_STATUSES or is_throttled(error)
+
+
+def retry_after(error):
+    """the seconds a Retry-After header on `error` asks for, or None"""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if hasattr(resp, 'get') else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:  # the HTTP-date form
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff(attempt, error=None):
+    """seconds to wait before retry number `attempt` + 1: exponential with
+    jitter (half fixed, half random), but never less than Retry-After"""
+    ceiling = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+    hint = retry_after(error) if error is not None else None
+    return max(delay, hint) if hint is not None else delay
+
+
+def wait_before_retry(attempt, errors):
+    """sleep off the backoff for a round of `errors`, pausing the bucket
+    for everyone if any of them was a quota error"""
+    delay = max(backoff(attempt, error) for error in errors)
+    if any(is_throttled(error) for error in errors):
+        limiter.pause(delay)
+    metrics.count('retries', len(errors))
+    time.sleep(delay)
+
+
+def check(budget):
+    """raise Cancelled if `budget`'s sync was cancelled"""
+    if budget is not None and budget.cancelled:
+        raise Cancelled()
+
+
+def call(fn, budget=None, cost=1):
+    """fn() under the rate limit, retried while the error is retryable,
+    attempts are left and `budget` (if any) grants another retry"""
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire(cost)
+        check(budget)
+        try:
+            return fn()
+        except Exception as e:
+            if (attempt + 1 == MAX_ATTEMPTS or not is_retryable(e)
+                    or (budget is not None and not budget.spend())):
+                raise
+            wait_before_retry(attempt, [e])
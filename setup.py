@@ -3,7 +3,7 @@ from setuptools import setup
 setup(
     name='BobsiMo Activities',
     version='1.0.0',
-    py_modules=['GUI', "core"],
+    py_modules=['GUI', "autosync", "core", "db", "google_service", "metrics", "scheduler", "widgets"],
     entry_points={
         'console_scripts': [
             'bma = GUI:main',
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core  # noqa: E402
+import db  # noqa: E402
+
+
+@pytest.fixture
+def tasks_db(tmp_path, monkeypatch):
+    """a fresh tasks.db in a temporary directory (core keeps it in the
+    working directory) with two lists, Home and Work"""
+    monkeypatch.chdir(tmp_path)
+    core.initialize_database()
+    with db.transaction(core.DB_FILE) as cursor:
+        cursor.execute("INSERT INTO tasklists (id, title) VALUES ('home', 'Home')")
+        cursor.execute("INSERT INTO tasklists (id, title) VALUES ('work', 'Work')")
+    core._forget_tasklist_ids()
+    yield
+    db.close_connection()
+    core._forget_tasklist_ids()
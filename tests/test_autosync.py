@@ -0,0 +1,59 @@
+import threading
+import time
+
+from google.oauth2.credentials import Credentials
+
+import autosync
+import core
+import google_service
+
+
+class DownHttp:
+    """an httplib2.Http whose network is down"""
+    timeout = None
+
+    def request(self, *args, **kwargs):
+        raise OSError(101, 'Network is unreachable')
+
+
+def worker(run, probe):
+    done = threading.Event()
+
+    def wrapped(pull, forced):
+        try:
+            return run(pull)
+        finally:
+            done.set()
+    sync = autosync.SyncWorker(wrapped, probe=probe)
+    sync._next_pull = time.monotonic() + 3600  # no automatic first run
+    sync.online = False
+    return sync, done
+
+
+def click_sync(sync, done):
+    sync.start()
+    sync.request_sync()
+    assert done.wait(5)
+    sync.stop()
+    sync._thread.join(5)
+
+
+def test_sync_button_works_when_the_probe_cannot_see_google():
+    sync, done = worker(lambda pull: (False, True), probe=lambda: False)
+    click_sync(sync, done)
+    assert sync.online
+    assert sync._probe is None  # later automatic runs don't wait on it
+
+
+def test_sync_button_with_the_network_down_keeps_the_probe(tasks_db, monkeypatch):
+    monkeypatch.setattr(google_service, '_http_factory', DownHttp)
+    creds = Credentials(token='fake-token')
+
+    def run(pull):  # what taskApp.sync makes of a pull
+        counts = core.pull_from_google(creds)
+        return False, counts['requests'] > 0
+
+    sync, done = worker(run, probe=lambda: False)
+    click_sync(sync, done)
+    assert not sync.online
+    assert sync._probe is not None
@@ -0,0 +1,36 @@
+"""what get_tasks_online yields, whatever order the lists come in"""
+import core
+
+LISTS = [{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}, {'id': 'c', 'title': 'C'}]
+
+
+class FakeService:
+    def tasklists(self):
+        return None
+
+
+def fetched(monkeypatch, items):
+    """get_tasks_online's tasks when the fetches hand back `items`"""
+    monkeypatch.setattr(core, 'get_service', lambda creds: FakeService())
+    monkeypatch.setattr(core, '_list_all', lambda *args, **kwargs: iter(LISTS))
+    monkeypatch.setattr(core, '_stream_tasklists', lambda *args: iter(items))
+    return list(core.get_tasks_online(creds=None))
+
+
+def test_lists_come_out_in_order(monkeypatch):
+    items = [(2, 'page', ['c1']), (1, 'page', ['b1']), (0, 'page', ['a1']),
+             (1, 'page', ['b2']), (1, 'done', None), (2, 'done', None),
+             (0, 'page', ['a2']), (0, 'done', None)]
+    assert fetched(monkeypatch, items) == ['a1', 'a2', 'b1', 'b2', 'c1']
+
+
+def test_a_failed_list_waiting_its_turn_is_left_out(monkeypatch):
+    items = [(0, 'page', ['a1']), (1, 'page', ['b1']), (1, 'failed', OSError()),
+             (2, 'unchanged', None), (0, 'done', None)]
+    assert fetched(monkeypatch, items) == ['a1']
+
+
+def test_a_failed_current_list_keeps_what_it_yielded(monkeypatch):
+    items = [(0, 'page', ['a1']), (1, 'page', ['b1']), (0, 'failed', OSError()),
+             (2, 'page', ['c1']), (1, 'done', None), (2, 'done', None)]
+    assert fetched(monkeypatch, items) == ['a1', 'b1', 'c1']
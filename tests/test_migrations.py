@@ -0,0 +1,80 @@
+"""upgrading tasks.db files written by older versions"""
+import json
+import sqlite3
+
+import core
+import db
+
+
+# the tasks table as the first release created it, before versioning
+BASELINE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS tasks (
+        id TEXT PRIMARY KEY, title TEXT NOT NULL, list_name TEXT NOT NULL,
+        due_time TEXT, notes TEXT, status TEXT NOT NULL
+    )
+'''
+
+
+def baseline_db(rows):
+    """a tasks.db as the first release left it, holding `rows`"""
+    conn = sqlite3.connect(core.DB_FILE)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany('INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def test_completed_rows_queued_on_upgrade_only_push_their_status(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    baseline_db([('done', 'Old title', 'Home', '', 'old notes', 'completed'),
+                 ('open', 'Still open', 'Home', '', '', 'needsAction')])
+    try:
+        core.initialize_database()
+        fields = dict(db.get_connection(core.DB_FILE).execute(
+            "SELECT task_id, fields FROM outbox WHERE op = 'update'"))
+        assert list(fields) == ['done']
+        assert list(json.loads(fields['done'])) == ['status']
+
+        # Google renamed it before the upgrade; the pull takes that
+        # rather than pushing the stale title back
+        core.upsert_tasks([{
+            'id': 'done', 'title': 'New title', 'due': '', 'notes': 'new notes',
+            'status': 'needsAction', 'position': '1', 'deleted': False,
+            'updated': '2020-01-01T00:00:00.000Z', 'list_name': 'Home', 'list_id': None}])
+        task = core.get_task_by_id('done')
+        assert (task.title, task.notes, task.status) == ('New title', 'new notes', 'completed')
+        fields = db.get_connection(core.DB_FILE).execute(
+            "SELECT fields FROM outbox WHERE task_id = 'done'").fetchone()[0]
+        assert list(json.loads(fields)) == ['status']
+    finally:
+        db.close_connection()
+
+
+def test_unused_sync_state_indexes_are_dropped(tasks_db):
+    indexes = {row[0] for row in db.get_connection(core.DB_FILE).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert not indexes & {'idx_tasks_local', 'idx_tasks_dirty'}
+    assert 'idx_tasks_by_list' in indexes
+
+
+def test_task_rowids_become_seq_and_search_still_finds_them(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    baseline_db([(f't{i}', f'Task {i}', 'Home', '', f'note{i}', 'needsAction')
+                 for i in range(5)])
+    conn = sqlite3.connect(core.DB_FILE)
+    conn.execute("DELETE FROM tasks WHERE id = 't1'")  # leave a gap in the rowids
+    conn.commit()
+    rowids = dict(conn.execute('SELECT id, rowid FROM tasks'))
+    conn.close()
+    try:
+        core.initialize_database()
+        conn = db.get_connection(core.DB_FILE)
+        assert dict(conn.execute('SELECT id, seq FROM tasks')) == rowids
+        assert [row[1] for row in conn.execute('PRAGMA table_info(tasks)') if row[5]] == ['seq']
+        assert [task.id for task in core.search_tasks('note3')] == ['t3']
+        core.update_local_task('t3', notes='renamed')
+        conn.execute('VACUUM')
+        assert [task.id for task in core.search_tasks('renamed')] == ['t3']
+        assert core.search_tasks('note3') == []
+    finally:
+        db.close_connection()
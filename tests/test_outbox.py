@@ -0,0 +1,125 @@
+"""_enqueue's folding of queued changes and _merge_edits' per-field
+merge of a pull into tasks with local edits"""
+import json
+
+import core
+import db
+
+
+def remote(task_id='t1', updated='2030-01-01T00:00:00.000Z', **fields):
+    """a task as a pull brings it back, Home's 'Buy milk' unless told otherwise"""
+    task = {'id': task_id, 'title': 'Buy milk', 'due': 'No due date', 'notes': '',
+            'status': 'needsAction', 'position': '1', 'updated': updated,
+            'deleted': False, 'list_name': 'Home', 'list_id': 'home'}
+    task.update(fields)
+    return task
+
+
+def outbox():
+    return [(task_id, op, list_id, json.loads(fields) if fields else None)
+            for task_id, op, list_id, fields in db.get_connection(core.DB_FILE).execute(
+                'SELECT task_id, op, list_id, fields FROM outbox ORDER BY seq')]
+
+
+def queue(task_id, op, **kwargs):
+    with db.transaction(core.DB_FILE) as cursor:
+        core._enqueue(cursor, task_id, op, **kwargs)
+
+
+def test_insert_then_update_is_an_insert(tasks_db):
+    queue('local-1', 'insert')
+    queue('local-1', 'update', fields={'title': ['2024-01-01T00:00:00+00:00', 'a']})
+    assert outbox() == [('local-1', 'insert', None, None)]
+
+
+def test_insert_then_delete_is_nothing(tasks_db):
+    queue('local-1', 'insert')
+    queue('local-1', 'delete', list_name='Home', list_id='home')
+    assert outbox() == []
+
+
+def test_updates_add_up_keeping_the_first_base(tasks_db):
+    queue('t1', 'update', fields={'title': ['2024-01-01T00:00:00+00:00', 'Buy milk']})
+    queue('t1', 'update', fields={'title': ['2024-01-02T00:00:00+00:00', 'Buy oat milk'],
+                                  'notes': ['2024-01-02T00:00:00+00:00', '']})
+    assert outbox() == [('t1', 'update', None, {
+        'title': ['2024-01-02T00:00:00+00:00', 'Buy milk'],
+        'notes': ['2024-01-02T00:00:00+00:00', '']})]
+
+
+def test_update_after_one_with_no_fields_still_pushes_everything(tasks_db):
+    queue('t1', 'update')
+    queue('t1', 'update', fields={'title': ['2024-01-01T00:00:00+00:00', 'Buy milk']})
+    assert outbox() == [('t1', 'update', None, None)]
+
+
+def test_delete_after_a_move_deletes_from_the_list_google_has_it_in(tasks_db):
+    queue('t1', 'update', list_name='Home', list_id='home',
+          fields={'list_name': ['2024-01-01T00:00:00+00:00', 'Home']})
+    queue('t1', 'delete', list_name='Work', list_id='work')
+    assert outbox() == [('t1', 'delete', 'home', None)]
+
+
+def test_edit_records_what_changed_and_what_it_was(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk', list_name='Home', notes='')
+    [(task_id, op, list_id, fields)] = outbox()
+    assert (task_id, op, list_id) == ('t1', 'update', None)
+    assert list(fields) == ['title']
+    assert fields['title'][1] == 'Buy milk'
+
+
+def test_edit_kept_when_google_changed_another_field(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk')
+    # ticked done on the phone, after the edit here
+    core.upsert_tasks([remote(status='completed')])
+
+    task = core.get_task_by_id('t1')
+    assert (task.title, task.status) == ('Buy oat milk', 'completed')
+    assert list(outbox()[0][3]) == ['title']
+
+
+def test_conflict_goes_to_the_newer_edit(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk', notes='2 litres')
+    with db.transaction(core.DB_FILE) as cursor:  # edited here long ago
+        cursor.execute('UPDATE outbox SET fields = ?', (json.dumps({
+            'title': ['2000-01-01T00:00:00+00:00', 'Buy milk'],
+            'notes': ['2100-01-01T00:00:00+00:00', '']}),))
+    core.upsert_tasks([remote(title='Buy soy milk', notes='1 litre')])
+
+    task = core.get_task_by_id('t1')
+    assert (task.title, task.notes) == ('Buy soy milk', '2 litres')
+    assert list(outbox()[0][3]) == ['notes']
+
+
+def test_fields_google_already_has_are_settled(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk')
+    core.upsert_tasks([remote(title='Buy oat milk')])
+
+    assert outbox() == []
+    assert db.get_connection(core.DB_FILE).execute(
+        "SELECT sync_state FROM tasks WHERE id = 't1'").fetchone() == ('synced',)
+
+
+def test_fields_without_a_base_go_by_time(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk')
+    with db.transaction(core.DB_FILE) as cursor:
+        cursor.execute('UPDATE outbox SET fields = ?',
+                       (json.dumps({'title': '2000-01-01T00:00:00+00:00'}),))
+    core.upsert_tasks([remote(status='completed')])
+
+    assert core.get_task_by_id('t1').title == 'Buy milk'
+    assert outbox() == []
+
+
+def test_pulling_back_googles_unchanged_copy_keeps_a_local_edit(tasks_db):
+    core.upsert_tasks([remote()])
+    core.update_local_task('t1', title='Buy oat milk')
+    counts = core.upsert_tasks([remote()])
+    assert counts['unchanged'] == 1
+    assert core.get_task_by_id('t1').title == 'Buy oat milk'
+    assert [entry[0] for entry in outbox()] == ['t1']
@@ -0,0 +1,57 @@
+"""what a pull writes, through _write_pulled and _finish_tasklist"""
+import itertools
+
+import core
+import db
+
+_pulls = itertools.count()
+
+
+def task(task_id, list_id, list_name):
+    return {'id': task_id, 'title': task_id, 'due': 'No due date', 'notes': '',
+            'status': 'needsAction', 'position': '1', 'updated': '2030-01-01T00:00:00.000Z',
+            'deleted': False, 'list_name': list_name, 'list_id': list_id}
+
+
+def ids_in(list_name):
+    return {row[0] for row in db.get_connection(core.DB_FILE).execute(
+        'SELECT id FROM tasks WHERE list_name = ?', (list_name,))}
+
+
+def pull_in_full(tasklist, tasks):
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    pulled_at = f'pull {next(_pulls)}'
+    core._write_pulled(tasks, {tasklist['id']}, pulled_at, counts)
+    core._finish_tasklist(tasklist, None, None, None, None, pulled_at, counts)
+    return counts
+
+
+def test_full_resync_leaves_lists_with_the_same_title_alone(tasks_db):
+    with db.transaction(core.DB_FILE) as cursor:
+        cursor.execute("INSERT INTO tasklists (id, title) VALUES ('home2', 'Home')")
+    pull_in_full({'id': 'home', 'title': 'Home'}, [task('a', 'home', 'Home')])
+
+    counts = pull_in_full({'id': 'home2', 'title': 'Home'}, [task('b', 'home2', 'Home')])
+    assert counts['deleted'] == 0
+    assert ids_in('Home') == {'a', 'b'}
+
+
+def test_full_resync_deletes_what_didnt_come_back(tasks_db):
+    pull_in_full({'id': 'home', 'title': 'Home'}, [task('a', 'home', 'Home'),
+                                                    task('b', 'home', 'Home')])
+    counts = pull_in_full({'id': 'home', 'title': 'Home'}, [task('a', 'home', 'Home')])
+    assert counts['deleted'] == 1
+    assert core.get_task_by_id('b') is None
+
+
+def test_a_list_deleted_on_google_takes_its_tasks_along(tasks_db):
+    pull_in_full({'id': 'work', 'title': 'Work'}, [task('a', 'work', 'Work'),
+                                                    task('b', 'work', 'Work')])
+    core.update_local_task('b', title='edited here')
+    counts = {'deleted': 0}
+    with db.transaction(core.DB_FILE) as cursor:
+        core._drop_tasklists(cursor, ['home'], counts)
+
+    assert counts['deleted'] == 1
+    assert ids_in('Work') == {'b'}  # kept for its queued edit
+    assert core.get_task_by_id('a') is None
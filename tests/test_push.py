@@ -0,0 +1,31 @@
+"""_run_batch, the push's batch sender"""
+import os
+import sys
+
+from google.oauth2.credentials import Credentials
+
+import core
+import google_service
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+from fakeserver import FakeTasksServer  # noqa: E402
+
+
+def test_a_sub_request_whose_callback_raises_counts_as_failed(monkeypatch):
+    server = FakeTasksServer()
+    server.load([{'id': 'home', 'title': 'Home'}], [])
+    monkeypatch.setattr(google_service, '_http_factory', server.http)
+    service = google_service.get_service(Credentials(token='fake-token'))
+    requests = {key: service.tasks().insert(tasklist='home', body={'title': key})
+                for key in ('a', 'b')}
+
+    def on_success(key, response):
+        if key == 'a':
+            raise RuntimeError('disk full')
+
+    failed = core._run_batch(service, requests, on_success)
+    assert list(failed) == ['a']
+    assert isinstance(failed['a'], RuntimeError)
+    # it worked on Google, so it isn't sent a second time
+    assert sorted(t['title'] for t in server.live_tasks().values()) == ['a', 'b']
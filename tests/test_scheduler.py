@@ -0,0 +1,45 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import scheduler
+
+
+def http_error(status, body):
+    resp = httplib2.Response({'status': status})
+    return HttpError(resp, json.dumps(body).encode())
+
+
+def v1_error(status, reason):
+    return http_error(status, {'error': {
+        'code': status, 'message': 'nope',
+        'errors': [{'domain': 'usageLimits', 'reason': reason, 'message': 'nope'}],
+    }})
+
+
+@pytest.mark.parametrize('reason', ['rateLimitExceeded', 'userRateLimitExceeded',
+                                    'quotaExceeded', 'dailyLimitExceeded'])
+def test_quota_403s_are_retried(reason):
+    error = v1_error(403, reason)
+    assert scheduler.is_throttled(error)
+    assert scheduler.is_retryable(error)
+
+
+def test_rpc_style_quota_403_is_retried():
+    error = http_error(403, {'error': {'code': 403, 'message': 'nope', 'details': [
+        {'@type': 'type.googleapis.com/google.rpc.ErrorInfo', 'reason': 'RATE_LIMIT_EXCEEDED'},
+    ]}})
+    assert scheduler.is_throttled(error)
+
+
+def test_permission_403_is_not_retried():
+    error = v1_error(403, 'forbidden')
+    assert not scheduler.is_throttled(error)
+    assert not scheduler.is_retryable(error)
+
+
+def test_403_with_a_plain_body_is_not_retried():
+    resp = httplib2.Response({'status': 403})
+    assert not scheduler.is_retryable(HttpError(resp, b'rateLimitExceeded? no json here'))
@@ -0,0 +1,42 @@
+"""GUI.TaskPages patching edits into the pages it holds"""
+import core
+from GUI import TaskPages
+
+
+def add(task_id, title, due):
+    core.upsert_tasks([{'id': task_id, 'title': title, 'due': due, 'notes': '',
+                        'status': 'needsAction', 'position': '1', 'deleted': False,
+                        'list_name': 'Home', 'list_id': 'home'}])
+
+
+def pages_held():
+    pages = TaskPages(None, 'due_time', core.count_tasks())
+    pages._add(0, pages._fetch(0, None, 0))
+    return pages
+
+
+def test_an_edit_that_keeps_its_place_is_patched_in(tasks_db):
+    add('a', 'Buy milk', '2030-01-01')
+    add('b', 'Call mum', '2030-01-02')
+    pages = pages_held()
+    core.update_local_task('a', title='Buy oat milk')
+    assert pages.patch(core.get_keyed_tasks({'a'}, 'due_time'))
+    assert [task.title for task in pages._pages[0]] == ['Buy oat milk', 'Call mum']
+
+
+def test_an_edit_that_moves_a_row_needs_a_reload(tasks_db):
+    add('a', 'Buy milk', '2030-01-01')
+    add('b', 'Call mum', '2030-01-02')
+    pages = pages_held()
+    core.update_local_task('a', due_time='2030-01-03')
+    assert not pages.patch(core.get_keyed_tasks({'a'}, 'due_time'))
+    assert [task.id for task in pages._pages[0]] == ['a', 'b']
+
+
+def test_an_edit_to_a_row_not_held_needs_a_reload(tasks_db):
+    add('a', 'Buy milk', '2030-01-01')
+    add('b', 'Call mum', '2030-01-02')
+    pages = pages_held()
+    add('c', 'Pay rent', '2030-01-03')
+    core.update_local_task('c', title='Pay the rent')
+    assert not pages.patch(core.get_keyed_tasks({'c'}, 'due_time'))
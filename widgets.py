@@ -0,0 +1,109 @@
+"""Widgets the GUI needs that customtkinter doesn't ship.
+
+VirtualList replaces CTkScrollableFrame for the task list. A scrollable
+frame needs a real row widget per task, so thousands of tasks meant
+thousands of frames, checkboxes and buttons built (and destroyed again)
+on every refresh. VirtualList only builds enough rows to fill the
+window and rebinds them to whichever items are scrolled into view.
+"""
+import tkinter
+
+import customtkinter as ctk
+
+
+class VirtualList(ctk.CTkFrame):
+    """A scrolling list that only has widgets for the rows in view.
+
+    make_row(parent) builds one empty row widget and bind_row(row, item)
+    points it at an item. Rows have a fixed height of `row_height`
+    pixels; `buffer` spare rows are kept bound below the viewport.
+    Items only need len() and indexing, so they can be a sequence that
+    loads itself as it is read (GUI.TaskPages).
+    """
+
+    def __init__(self, master, make_row, bind_row, row_height=48, buffer=2, **kwargs):
+        super().__init__(master, **kwargs)
+        self._make_row = make_row
+        self._bind_row = bind_row
+        self.row_height = row_height
+        self.buffer = buffer
+        self.items = []
+        self._top = 0  # pixels scrolled past the top of the list
+        self._rows = []
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._scroll_command)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.body.bind("<Configure>", lambda event: self.redraw())
+        self._bind_wheel(self.body)
+
+    def set_items(self, items):
+        """Show `items`, keeping the scroll position where possible."""
+        self.items = items
+        self.redraw()
+
+    def visible(self):
+        """(first, last) index of the items in view"""
+        first = self._top // self.row_height
+        return first, first + -(-self._viewport_height() // self.row_height)
+
+    def scroll_to(self, top):
+        self._top = int(min(max(top, 0), self._max_top()))
+        self.redraw()
+
+    def redraw(self):
+        """Rebind the pooled rows to the items currently in view."""
+        height = self._viewport_height()
+        needed = min(-(-height // self.row_height) + 1 + self.buffer, len(self.items))
+        while len(self._rows) < needed:
+            row = self._make_row(self.body)
+            self._bind_wheel(row)
+            self._rows.append(row)
+
+        self._top = min(self._top, self._max_top())
+        first = self._top // self.row_height
+        offset = first * self.row_height - self._top
+
+        for i, row in enumerate(self._rows):
+            index = first + i
+            if i < needed and index < len(self.items):
+                self._bind_row(row, self.items[index])
+                row.place(x=0, y=offset + i * self.row_height, relwidth=1)
+            else:
+                row.place_forget()
+
+        total = len(self.items) * self.row_height
+        if total <= height:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self._top / total, (self._top + height) / total)
+
+    def _viewport_height(self):
+        # winfo_height is in screen pixels, row_height and place() in
+        # ctk's unscaled units
+        return max(int(self.body.winfo_height() / self._get_widget_scaling()), 1)
+
+    def _max_top(self):
+        return max(len(self.items) * self.row_height - self._viewport_height(), 0)
+
+    def _scroll_command(self, action, amount, unit=None):
+        """the scrollbar's yview protocol: moveto <fraction> or scroll <n> units|pages"""
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self.items) * self.row_height)
+        elif action == "scroll":
+            step = self.row_height if unit == "units" else self._viewport_height()
+            self.scroll_to(self._top + int(amount) * step)
+
+    def _on_wheel(self, event):
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self._top + (-3 if up else 3) * self.row_height)
+        return "break"
+
+    def _bind_wheel(self, widget):
+        # bind the plain tk widgets underneath, ctk's bind() only
+        # reaches a widget's canvas
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tkinter.Misc.bind(widget, sequence, self._on_wheel, "+")
+        for child in widget.winfo_children():
+            self._bind_wheel(child)